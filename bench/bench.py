@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# Benchmarks of the hot functions of the scripts on fake UNO objects, see
+# fake_uno.py. Reports wall time and the number of bridge calls made, which is
+# what dominates the run time against a real office.
+#
+# usage: bench/bench.py [--sizes 100,1000,10000,100000] [--latency SECONDS] [names...]
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fake_uno
+fake_uno.installFakeUnoIfMissing()
+from lo_connect import loadScript
+
+oxana  = loadScript('oxana-influencers-calc-to-impress.py')
+paper  = loadScript('format-student-paper.py')
+tools  = loadScript('uno-introspect-tools.py')
+import table_plan
+
+TOP_TABLE_ROWS  = 10 # rows per table of the template slides, besides the header
+TAIL_TABLE_ROWS = 10
+N_TAIL_TABLES   = 2
+
+# Every benchmark takes a size and a Bridge, builds its synthetic document, and
+# returns a function to time.
+
+def benchCollectFromPivotTable(n, bridge):
+    sheet = fake_uno.mentionsSheet(n, bridge)
+    return lambda: oxana.collectFromPivotTable(sheet, oxana.INFLUENCER_TYPES)
+
+def benchCollectRankings(n, bridge):
+    sheet = fake_uno.mentionsSheet(n, bridge)
+    spreadsheet = fake_uno.Spreadsheet(bridge, [sheet])
+    return lambda: oxana.collectRankings(spreadsheet, sheet)
+
+def rankedRows(n):
+    return [(i, oxana.PivotRow('author{}'.format(i), i, '1')) for i in range(n, 0, -1)]
+
+def benchFillSlideTableFromSheet(n, bridge):
+    table = fake_uno.TableShape(bridge, 4, n + 1)
+    rows = rankedRows(n)
+    return lambda: oxana.fillSlideTableFromSheet(table, iter(rows))
+
+# the UNO path of buildSlides past the slide cloning: duplicating the tail slide
+# and filling all the tables; the cloned slides follow a title slide, as there
+def benchFillPlannedSlides(n, bridge):
+    rows = [oxana.slideRowContents(pivotRow, views) for (views, pivotRow) in rankedRows(n)]
+    presentation = fake_uno.Presentation(bridge, [
+        fake_uno.tableSlide(0, 0, bridge),
+        fake_uno.tableSlide(1, TOP_TABLE_ROWS, bridge),
+        fake_uno.tableSlide(N_TAIL_TABLES, TAIL_TABLE_ROWS, bridge)])
+    plan = table_plan.planTableRows([TOP_TABLE_ROWS], [TAIL_TABLE_ROWS] * N_TAIL_TABLES, n)
+    return lambda: oxana.fillPlannedSlides(presentation, 1, plan, rows)
+
+def benchAddNumberingSomeHeading1n2s(n, bridge):
+    document = fake_uno.thesis(n, bridge)
+    def run():
+        edits = paper.ParEdits()
+        paper.addNumberingSomeHeading1n2s(document, edits.insertNewlineAfterPar,
+                                          edits.insertSpaceStartPar)
+        edits.apply(fake_uno.local(document, 'Text'))
+    return run
+
+def benchSearchLimited(n, bridge):
+    document = fake_uno.thesis(n, bridge)
+    wanted = 'paragraph {}'.format(n - 1)
+    tools.memberCache = tools.MemberCache()
+    return lambda: tools.searchLimited(document, wanted, 3,
+                                       lambda p: isinstance(p, str), lambda name: False)
+
+BENCHMARKS = {
+    'collectFromPivotTable':       benchCollectFromPivotTable,
+    'collectRankings':             benchCollectRankings,
+    'fillSlideTableFromSheet':     benchFillSlideTableFromSheet,
+    'fillPlannedSlides':           benchFillPlannedSlides,
+    'addNumberingSomeHeading1n2s': benchAddNumberingSomeHeading1n2s,
+    'searchLimited':               benchSearchLimited,
+}
+
+def runBenchmark(name, n, latency):
+    bridge = fake_uno.Bridge(latency)
+    run = BENCHMARKS[name](n, bridge)
+    bridge.calls = 0 # building the document doesn't count
+    start = time.perf_counter()
+    run()
+    return (time.perf_counter() - start, bridge.calls)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100,1000,10000,100000',
+                        help="comma-separated numbers of rows/paragraphs")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds every simulated bridge call takes")
+    parser.add_argument('names', nargs='*',
+                        help="benchmarks to run, all by default: " + ', '.join(BENCHMARKS))
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: " + ', '.join(sorted(unknown)))
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    print("{:<28} {:>8} {:>10} {:>12}".format("benchmark", "size", "wall s", "bridge calls"))
+    for name, n in itertools.product(args.names or BENCHMARKS, sizes):
+        (seconds, calls) = runBenchmark(name, n, args.latency)
+        print("{:<28} {:>8} {:>10.3f} {:>12}".format(name, n, seconds, calls))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!python
+# In-process stand-ins for the UNO objects the scripts work with, for benchmarking
+# without an office. Every access to a public member of a fake object counts as a
+# bridge call, and may be slowed down by a configurable latency to simulate the
+# socket. Only the parts of the API the scripts actually use are implemented.
+import sys
+import time
+import types
+
+class Bridge:
+    """Counts simulated bridge calls, and delays each by `latency` seconds"""
+    def __init__(self, latency = 0.0):
+        self.latency = latency
+        self.calls   = 0
+
+    def call(self):
+        self.calls += 1
+        if self.latency:
+            deadline = time.perf_counter() + self.latency
+            while time.perf_counter() < deadline: # sleep() is too coarse for microseconds
+                pass
+
+class FakeUno:
+    """Base of fake UNO objects; members not starting with an underscore are the
+    UNO API, and accessing them goes over the Bridge"""
+    def __init__(self, bridge, **fields):
+        object.__setattr__(self, '_bridge', bridge)
+        for name, val in fields.items():
+            object.__setattr__(self, name, val)
+
+    def __getattribute__(self, name):
+        if not name.startswith('_'):
+            object.__getattribute__(self, '_bridge').call()
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, val):
+        if not name.startswith('_'):
+            self._bridge.call()
+        object.__setattr__(self, name, val)
+
+    def __dir__(self):
+        return [name for name in object.__dir__(self) if not name.startswith('_')]
+
+    def _items(self):
+        return []
+
+    def __iter__(self):
+        for item in self._items():
+            self._bridge.call()
+            yield item
+
+# reading and writing members of fake objects on the office side, i.e. without
+# going over the bridge
+def local(obj, name):
+    return object.__getattribute__(obj, name)
+
+def setLocal(obj, name, val):
+    object.__setattr__(obj, name, val)
+
+class Struct:
+    """A UNO struct, these are copied by value, so accessing them is local"""
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+class IndexAccess(FakeUno):
+    def __init__(self, bridge, items):
+        FakeUno.__init__(self, bridge)
+        self._list = items
+
+    def _items(self):
+        return self._list
+
+    @property
+    def Count(self):
+        return len(self._list)
+
+    def getCount(self):
+        return len(self._list)
+
+    def getByIndex(self, i):
+        return self._list[i]
+
+class NameAccess(FakeUno):
+    def __init__(self, bridge, items):
+        FakeUno.__init__(self, bridge)
+        self._dict = items
+
+    def _items(self):
+        return list(self._dict.values())
+
+    def getByName(self, name):
+        return self._dict[name]
+
+    def hasByName(self, name):
+        return name in self._dict
+
+# Calc
+
+class CellRange(FakeUno):
+    def __init__(self, bridge, data):
+        FakeUno.__init__(self, bridge)
+        self._data = data
+
+    @property
+    def DataArray(self):
+        return tuple(tuple(row) for row in self._data)
+
+    def getDataArray(self):
+        return local(self, 'DataArray')
+
+class Sheet(FakeUno):
+    def __init__(self, bridge, data, dataPilotTables = ()):
+        FakeUno.__init__(self, bridge,
+                         DataPilotTables = IndexAccess(bridge, list(dataPilotTables)))
+        self._data = data # [[a]]
+
+    def getCellRangeByPosition(self, startCol, startRow, endCol, endRow):
+        return CellRange(self._bridge, [row[startCol : endCol + 1]
+                                        for row in self._data[startRow : endRow + 1]])
+
+class PilotFilter(FakeUno):
+    def __init__(self, bridge, name):
+        FakeUno.__init__(self, bridge, Name = name, IsHidden = False)
+
+class PilotField(FakeUno):
+    def __init__(self, bridge, name, items = ()):
+        FakeUno.__init__(self, bridge, Name = name, Items = IndexAccess(bridge, list(items)))
+
+class DataPilotTable(FakeUno):
+    def __init__(self, bridge, outputRange, sourceRange, fields, rowFields, dataFields):
+        FakeUno.__init__(self, bridge,
+                         OutputRange     = outputRange,
+                         SourceRange     = sourceRange,
+                         DataPilotFields = NameAccess(bridge, {local(f, 'Name'): f
+                                                               for f in fields}),
+                         RowFields       = IndexAccess(bridge, rowFields),
+                         DataFields      = IndexAccess(bridge, dataFields))
+
+AUTHOR_TYPES = ['Blogger', 'Celebrity', 'Publisher', 'Other']
+
+# Int -> Bridge -> Sheet; a sheet 'QQ' with a pivot table of `nRows` authors, the
+# pivot source (2 mentions per author) is on the same sheet, to the right of it
+def mentionsSheet(nRows, bridge):
+    N_TECHNICAL_ROWS_AT_START = 5
+    SOURCE_COL = 4
+    nSourceRows = nRows * 2 + 1
+    data = [[''] * (SOURCE_COL + 3) for _ in range(max(nRows + 6, nSourceRows))]
+    for i in range(nRows):
+        data[N_TECHNICAL_ROWS_AT_START + i][0:3] = ['author{}'.format(i), float(i * 100), 2.0]
+    data[0][SOURCE_COL:] = ['Author', 'Author type', 'Views']
+    for i in range(nSourceRows - 1):
+        data[i + 1][SOURCE_COL:] = ['author{}'.format(i // 2),
+                                    AUTHOR_TYPES[(i // 2) % len(AUTHOR_TYPES)], float(i * 50)]
+    filters = [PilotFilter(bridge, name) for name in AUTHOR_TYPES]
+    pilot = DataPilotTable(
+        bridge,
+        Struct(StartColumn=0, StartRow=0, EndColumn=2, EndRow=N_TECHNICAL_ROWS_AT_START + nRows),
+        Struct(Sheet=0, StartColumn=SOURCE_COL, StartRow=0,
+               EndColumn=SOURCE_COL + 2, EndRow=nSourceRows - 1),
+        [PilotField(bridge, 'Author type', filters)],
+        [PilotField(bridge, 'Author')], [PilotField(bridge, 'Sum - Views')])
+    return Sheet(bridge, data, [pilot])
+
+class Spreadsheet(FakeUno):
+    def __init__(self, bridge, sheets):
+        FakeUno.__init__(self, bridge, Sheets = IndexAccess(bridge, sheets))
+
+# Impress
+
+class TableCell(FakeUno):
+    def __init__(self, bridge):
+        FakeUno.__init__(self, bridge, String = '')
+
+    def setString(self, string):
+        setLocal(self, 'String', string)
+
+class TableModel(FakeUno):
+    def __init__(self, bridge, nCols, nRows):
+        FakeUno.__init__(self, bridge,
+                         Rows    = IndexAccess(bridge, [None] * nRows),
+                         Columns = IndexAccess(bridge, [None] * nCols))
+        self._cells = [[TableCell(bridge) for _ in range(nCols)] for _ in range(nRows)]
+
+    def getCellByPosition(self, col, row):
+        return self._cells[row][col]
+
+    def getCellRangeByPosition(self, startCol, startRow, endCol, endRow):
+        return FakeUno(self._bridge) # no XCellRangeData, just like in Impress
+
+class TableShape(FakeUno):
+    def __init__(self, bridge, nCols, nRows):
+        FakeUno.__init__(self, bridge,
+                         ShapeType = 'com.sun.star.drawing.TableShape',
+                         Model = TableModel(bridge, nCols, nRows))
+        self._locks = 0
+
+    def addActionLock(self):
+        self._locks += 1
+
+    def removeActionLock(self):
+        self._locks -= 1
+
+class Slide(IndexAccess):
+    def __init__(self, bridge, shapes):
+        IndexAccess.__init__(self, bridge, shapes)
+
+    def remove(self, shape):
+        self._list.remove(shape)
+
+    def _copy(self):
+        return Slide(self._bridge, [TableShape(self._bridge, len(local(shape, 'Model')._cells[0]),
+                                               len(local(shape, 'Model')._cells))
+                                    for shape in self._list])
+
+class Presentation(FakeUno):
+    def __init__(self, bridge, slides):
+        FakeUno.__init__(self, bridge, DrawPages = IndexAccess(bridge, slides))
+
+    def duplicate(self, slide):
+        pages = local(self, 'DrawPages')._list
+        copy = slide._copy()
+        pages.insert(pages.index(slide) + 1, copy)
+        return copy
+
+# Int -> Int -> Int -> Bridge -> Slide; a slide of tables with header plus `nRows`
+def tableSlide(nTables, nRows, bridge, nCols = 4):
+    return Slide(bridge, [TableShape(bridge, nCols, nRows + 1) for _ in range(nTables)])
+
+# Writer
+
+class Style(FakeUno):
+    def __init__(self, bridge, name):
+        FakeUno.__init__(self, bridge, Name = name, DisplayName = name)
+
+class SearchDescriptor(FakeUno):
+    def __init__(self, bridge):
+        FakeUno.__init__(self, bridge, SearchStyles = False, SearchString = '')
+
+class TextPosition:
+    """A position in FakeText; moves along with edits before it, like UNO ranges do"""
+    def __init__(self, par, atEnd):
+        self.par   = par
+        self.atEnd = atEnd
+
+PARAGRAPH_PROPERTIES = ['ParaStyleName', 'NumberingStyleName', 'BreakType']
+
+class PropertySetInfo(FakeUno):
+    def __init__(self, bridge, names):
+        FakeUno.__init__(self, bridge, Properties = tuple(Struct(Name = name) for name in names))
+
+class Paragraph(FakeUno):
+    """Has members that throw, like real UNO objects do: ListLabelString throws
+    unless the paragraph is numbered, ParaUserDefinedAttributes always does"""
+    def __init__(self, bridge, text, index, styleName, string):
+        FakeUno.__init__(self, bridge,
+                         Text = text,
+                         ParaStyleName = styleName,
+                         String = string,
+                         NumberingStyleName = '',
+                         BreakType = 0,
+                         ImplementationName = 'SwXParagraph',
+                         Types = (),
+                         PropertySetInfo = PropertySetInfo(bridge, PARAGRAPH_PROPERTIES))
+        self._index = index
+
+    def supportsService(self, name):
+        return name == "com.sun.star.text.Paragraph"
+
+    def setPropertyValue(self, name, val):
+        setLocal(self, name, val)
+
+    def getPropertyValues(self, names):
+        return tuple(local(self, name) for name in names)
+
+    @property
+    def ListLabelString(self):
+        if not local(self, 'NumberingStyleName'):
+            raise RuntimeError("not numbered")
+        return '1.'
+
+    @property
+    def ParaUserDefinedAttributes(self):
+        raise RuntimeError("Getting from this property is not supported")
+
+    @property
+    def Start(self):
+        return TextPosition(self, False)
+
+    @property
+    def End(self):
+        return TextPosition(self, True)
+
+class TextCursor(FakeUno):
+    def __init__(self, bridge):
+        FakeUno.__init__(self, bridge)
+        self._pos = None
+
+    def gotoRange(self, pos, expand):
+        self._pos = pos
+
+    def gotoPreviousWord(self, expand):
+        return True
+
+    @property
+    def String(self):
+        return ''
+
+class Enumeration(FakeUno):
+    def __init__(self, bridge, items):
+        FakeUno.__init__(self, bridge)
+        self._iter = iter(items)
+        self._next = next(self._iter, None)
+
+    def hasMoreElements(self):
+        return self._next is not None
+
+    def nextElement(self):
+        (ret, self._next) = (self._next, next(self._iter, None))
+        return ret
+
+class FakeText(FakeUno):
+    def __init__(self, bridge):
+        FakeUno.__init__(self, bridge, ImplementationName = 'SwXBodyText', Types = ())
+        self._pars = []
+
+    def _items(self):
+        return self._pars
+
+    def createEnumeration(self):
+        return Enumeration(self._bridge, self._pars)
+
+    def createTextCursor(self):
+        return TextCursor(self._bridge)
+
+    def insertString(self, cursor, string, absorb):
+        pos = cursor._pos
+        old = local(pos.par, 'String')
+        setLocal(pos.par, 'String', old + string if pos.atEnd else string + old)
+
+    def compareRegionStarts(self, a, b):
+        return (a._index < b._index) - (a._index > b._index)
+
+class TextDocument(FakeUno):
+    def __init__(self, bridge, text, styleNames):
+        FakeUno.__init__(self, bridge, Text = text, StyleFamilies = NameAccess(
+            bridge, {'ParagraphStyles': NameAccess(
+                bridge, {name: Style(bridge, name) for name in styleNames})}))
+
+    def createSearchDescriptor(self):
+        return SearchDescriptor(self._bridge)
+
+    def findAll(self, search):
+        searchString = local(search, 'SearchString')
+        return IndexAccess(self._bridge, [par for par in local(self, 'Text')._pars
+                                          if local(par, 'ParaStyleName') == searchString])
+
+HEADINGS_EVERY = 20 # every 20-th paragraph is a heading
+
+# Int -> Bridge -> TextDocument; a thesis of `nPars` paragraphs, with a heading
+# every HEADINGS_EVERY paragraphs, chapters of ~5 headings
+def thesis(nPars, bridge):
+    text = FakeText(bridge)
+    for i in range(nPars):
+        if i % HEADINGS_EVERY != 0:
+            style = 'Text body'
+        elif (i // HEADINGS_EVERY) % 5 == 0:
+            style = 'Heading 1'
+        else:
+            style = 'Heading 2'
+        text._pars.append(Paragraph(bridge, text, i, style, 'paragraph {}'.format(i)))
+    return TextDocument(bridge, text,
+                        ['Text body', 'Heading 1', 'Heading 2', 'Heading 5'])
+
+# a module to stand for `uno` when PyUNO isn't installed, just enough for the
+# scripts to be imported
+def fakeUnoModule():
+    uno = types.ModuleType('uno')
+    class ByteSequence(bytes):
+        pass
+    class Enum:
+        def __init__(self, typeName, value):
+            self.typeName = typeName
+            self.value = value
+    uno.ByteSequence = ByteSequence
+    uno.Enum = Enum
+    uno.getClass = lambda name: type(name.rpartition('.')[2], (Exception,), {})
+    uno.createUnoStruct = lambda name, *args: Struct()
+    def getComponentContext():
+        raise RuntimeError("fake uno module: there's no office to connect to")
+    uno.getComponentContext = getComponentContext
+    return uno
+
+def installFakeUnoIfMissing():
+    try:
+        import uno
+    except ImportError:
+        sys.modules['uno'] = fakeUnoModule()
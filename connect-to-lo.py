@@ -1,18 +1,8 @@
 #!python
-import uno
+from lo_connect import connectToLO
 
 # run libreoffice as:
 # soffice --calc --accept="socket,host=localhost,port=2002;urp;StarOffice.ServiceManager"
 
-def connectToLO():
-    # get the uno component context from the PyUNO runtime
-    localContext = uno.getComponentContext()
-    resolver = localContext.ServiceManager.createInstanceWithContext(
-        "com.sun.star.bridge.UnoUrlResolver", localContext )
-    # connect to the running office
-    ctx = resolver.resolve( "uno:socket,host=localhost,port=2002;urp;StarOffice.ComponentContext" )
-    smgr = ctx.ServiceManager
-    desktop = smgr.createInstanceWithContext( "com.sun.star.frame.Desktop",ctx)
-    return desktop.CurrentComponent
-
-model = connectToLO()
+(desktop, smgr) = connectToLO()
+model = desktop.CurrentComponent
@@ -1,6 +1,10 @@
 #!/usr/bin/python3
 import uno
 import os
+import time
+import argparse
+from functools import cmp_to_key
+from lo_connect import connectToLO, OfficePool, openedForEdit, bridgeErrors
 
 # that's like a consts, but they isn't since consts not allowed in python 😝
 HEADING1    = "Heading 1"
@@ -8,55 +12,100 @@ HEADING2    = "Heading 2"
 HEADING5    = "Heading 5" #appendinx
 STYLESFILE  = "./styles.odt"
 PAGE_BEFORE = 4 #that is from enumeration — that awful API have problems with them
-
-def rmLastEmptyLine(paragraph):
-    cursor = paragraph.Text.createTextCursor() #it is created at start of document, not paragraph
-    cursor.gotoRange(paragraph.End, False) #get end of the current paragraph
-    cursor.gotoPreviousWord(True)
-    if cursor.String.endswith('\n'):
-        cursor.String = cursor.String[:-1] #strip last newline
+PORT        = 8100
+POOL_PORT   = 8110 #headless offices of the batch mode go since here, away from PORT
 
 def overwriteStyles(document, fromFile):
     """First arg is the document itself, the second is a string with path to style file in UNO API format"""
     styles = document.StyleFamilies
     styles.loadStylesFromURL(fromFile, styles.StyleLoaderOptions)
 
-def addNumberingSomeHeading1n2s(text, h1TillBiblio=None, h1n2Numbered=None):
-    enumeration = text.createEnumeration()
+def overwriteStylesFromDocument(document, stylesDocument):
+    """Same as overwriteStyles, but takes styles from an already loaded document"""
+    styles = document.StyleFamilies
+    styles.loadStylesFromDocument(stylesDocument, styles.StyleLoaderOptions)
+
+# Document -> [String] -> [(Int, String, TextRange)]; paragraphs of the main text
+# having `styleNames`, in document order, with their ordinal and style name. Uses a
+# style search per style, so that other paragraphs aren't touched at all.
+def outlineIndex(document, styleNames):
+    paraStyles = document.StyleFamilies.getByName("ParagraphStyles")
+    text = document.Text
+    headings = []
+    for styleName in styleNames:
+        if not paraStyles.hasByName(styleName):
+            continue
+        search = document.createSearchDescriptor()
+        search.SearchStyles = True
+        search.SearchString = paraStyles.getByName(styleName).DisplayName #search wants UI names
+        found = document.findAll(search)
+        for i in range(0, found.getCount()):
+            par = found.getByIndex(i)
+            if par.Text == text: #not in a table, frame, etc
+                headings.append((styleName, par))
+    #compareRegionStarts() is 1 when the 1-st range is before the 2-nd one
+    headings.sort(key=cmp_to_key(lambda a, b: text.compareRegionStarts(b[1], a[1])))
+    return [(i, styleName, par) for i, (styleName, par) in enumerate(headings)]
+
+def addNumberingSomeHeading1n2s(document, h1TillBiblio=None, h1n2Numbered=None):
     heading1s = 0 #«2» is intro; «5» is 3-rd chapter; «7» is biblio
-    while enumeration.hasMoreElements():
-        par = enumeration.nextElement()
-        if ( par.supportsService("com.sun.star.text.Paragraph") and
-            par.ParaStyleName != None):
-            if par.ParaStyleName == HEADING1:
-                heading1s = heading1s + 1
-                if ( heading1s <= 6 #till, but excluding biblio
-                     and h1TillBiblio != None):
-                    h1TillBiblio(par)
-            if (par.ParaStyleName == HEADING1 or
-                par.ParaStyleName == HEADING2):
-                if (heading1s > 5 or heading1s == 1 or heading1s == 2):
-                    par.setPropertyValue("NumberingStyleName", "NONE")
-                else:
-                    par.setPropertyValue("NumberingStyleName", "Numbering 1")
-                    if h1n2Numbered != None:
-                        h1n2Numbered(par)
-                if heading1s >= 8: #fuck this shit
-                    par.setPropertyValue("BreakType", 0) #remove page break
-            if (heading1s == 7 and par.ParaStyleName == HEADING5): #just after the biblio, the first appendix
-                par.setPropertyValue("BreakType", PAGE_BEFORE)
-
-
-def insertNewlineAfterPar(par):
-    cursor = par.Text.createTextCursor() #it is created at start of document, not paragraph!
-    cursor.gotoRange(par.End, False) #get end of the current paragraph
-    #cursor.goRight(1, False)
-    cursor.String = "\n"
-
-def insertSpaceStartPar(par):
-    cursor = par.Text.createTextCursor() #it is created at start of document, not paragraph!
-    cursor.gotoRange(par.Start, False) #get start of the current paragraph
-    cursor.String = " "
+    for (_, styleName, par) in outlineIndex(document, [HEADING1, HEADING2, HEADING5]):
+        if styleName == HEADING1:
+            heading1s = heading1s + 1
+            if ( heading1s <= 6 #till, but excluding biblio
+                 and h1TillBiblio != None):
+                h1TillBiblio(par)
+        if (styleName == HEADING1 or
+            styleName == HEADING2):
+            if (heading1s > 5 or heading1s == 1 or heading1s == 2):
+                par.setPropertyValue("NumberingStyleName", "NONE")
+            else:
+                par.setPropertyValue("NumberingStyleName", "Numbering 1")
+                if h1n2Numbered != None:
+                    h1n2Numbered(par)
+            if heading1s >= 8: #fuck this shit
+                par.setPropertyValue("BreakType", 0) #remove page break
+        if (heading1s == 7 and styleName == HEADING5): #just after the biblio, the first appendix
+            par.setPropertyValue("BreakType", PAGE_BEFORE)
+
+
+#kinds of ParEdits
+INSERT_AT_START    = 0
+INSERT_AT_END      = 1
+STRIP_LAST_NEWLINE = 2
+
+class ParEdits:
+    """Paragraph edits recorded while walking the document, applied later in one go
+    by apply(). The edits must be recorded in document order; they get applied
+    backwards with a single cursor, so that an edit doesn't shift paragraphs that
+    are yet to be edited, and the walk isn't disturbed by edits either."""
+    def __init__(self):
+        self.edits = [] # [(Int, TextRange, String)]: kind, paragraph, text to insert
+
+    def insertNewlineAfterPar(self, par):
+        self.edits.append((INSERT_AT_END, par, "\n"))
+
+    def insertSpaceStartPar(self, par):
+        self.edits.append((INSERT_AT_START, par, " "))
+
+    def rmLastEmptyLine(self, par):
+        self.edits.append((STRIP_LAST_NEWLINE, par, None))
+
+    def apply(self, text):
+        cursor = text.createTextCursor() #it is created at start of document, it's moved below
+        for (kind, par, string) in reversed(self.edits):
+            if kind == INSERT_AT_START:
+                cursor.gotoRange(par.Start, False)
+                text.insertString(cursor, string, False)
+            elif kind == INSERT_AT_END:
+                cursor.gotoRange(par.End, False)
+                text.insertString(cursor, string, False)
+            else:
+                cursor.gotoRange(par.End, False) #get end of the current paragraph
+                cursor.gotoPreviousWord(True)
+                if cursor.String.endswith('\n'):
+                    cursor.String = cursor.String[:-1] #strip last newline
+        self.edits = []
 
 def absoluteUrl(relativeFile):
     """Constructs absolute path to the current dir in the format required by PyUNO that working with files"""
@@ -81,29 +130,105 @@ def setFirstPage(file):
     enumeration = file.Text.createEnumeration()
     enumeration.nextElement().PageDescName = 'First Page'
 
-#connect to office, and get the file object
-localContext = uno.getComponentContext()
-resolver = localContext.ServiceManager.createInstanceWithContext(
-                "com.sun.star.bridge.UnoUrlResolver", localContext )
-smgr = resolver.resolve( "uno:socket,host=localhost,port=8100;urp;StarOffice.ServiceManager" )
-remoteContext = smgr.getPropertyValue( "DefaultContext" )
-desktop = smgr.createInstanceWithContext( "com.sun.star.frame.Desktop",remoteContext)
-file = desktop.loadComponentFromURL(absoluteUrl("./output/output.odt") ,"_blank", 0, ())
-
-overwriteStyles(file, absoluteUrl(STYLESFILE))
-#insert at the beginning the file with Chapter1
-cursor = file.Text.createTextCursor()
-cursor.gotoStart(False)
-#to not screw the first paragraph formatting let's first make an empty one here
-parBreak(file, cursor)
-cursor.gotoStart(False)
-cursor.insertDocumentFromURL(absoluteUrl("./Ch1.odt"), ())
-addNumberingSomeHeading1n2s(file.Text, insertNewlineAfterPar, insertSpaceStartPar)
-updateTOC(file) #the inserted TOC needs to be updated
-
-#save the file
-file.storeAsURL(absoluteUrl("./output/Курсовая.doc"),())
-file.storeAsURL(absoluteUrl("./output/Курсовая.odt"),())
-file.dispose()
-
-print("Not implemented: removing Appendinx entries from the end of TOC")
+def formatPaper(desktop, paperDir, stylesDocument=None):
+    """Formats the paper in `paperDir`: its output/output.odt gets Ch1.odt inserted at
+    the beginning and the styles applied, the result is saved to output/Курсовая.*
+    Styles come from STYLESFILE, or from `stylesDocument` if it's given"""
+    inPaperDir = lambda relativeFile: absoluteUrl(os.path.join(paperDir, relativeFile))
+    with openedForEdit(desktop, [inPaperDir("output/output.odt")]) as (file,):
+        formatDocument(file, inPaperDir, stylesDocument)
+
+def formatDocument(file, inPaperDir, stylesDocument=None):
+    if stylesDocument is None:
+        overwriteStyles(file, absoluteUrl(STYLESFILE))
+    else:
+        overwriteStylesFromDocument(file, stylesDocument)
+    #insert at the beginning the file with Chapter1
+    cursor = file.Text.createTextCursor()
+    cursor.gotoStart(False)
+    #to not screw the first paragraph formatting let's first make an empty one here
+    parBreak(file, cursor)
+    cursor.gotoStart(False)
+    cursor.insertDocumentFromURL(inPaperDir("Ch1.odt"), ())
+    edits = ParEdits()
+    addNumberingSomeHeading1n2s(file, edits.insertNewlineAfterPar, edits.insertSpaceStartPar)
+    edits.apply(file.Text)
+    updateTOC(file) #the inserted TOC needs to be updated
+
+    #save the file
+    file.storeAsURL(inPaperDir("output/Курсовая.doc"),())
+    file.storeAsURL(inPaperDir("output/Курсовая.odt"),())
+
+def isPaperDir(dir):
+    return os.path.isfile(os.path.join(dir, "output/output.odt"))
+
+# [String] -> [String]; args are paper dirs, dirs with paper dirs inside, or
+# manifests, i.e. files with a paper dir per line, relative to the manifest
+def collectPapers(args):
+    papers = []
+    for arg in args:
+        if os.path.isfile(arg):
+            with open(arg) as manifest:
+                papers += [os.path.join(os.path.dirname(arg), line.strip()) for line in manifest
+                           if line.strip() and not line.startswith('#')]
+        elif isPaperDir(arg):
+            papers.append(arg)
+        else:
+            papers += sorted(os.path.join(arg, dir) for dir in os.listdir(arg)
+                             if isPaperDir(os.path.join(arg, dir)))
+    return papers
+
+# returns (seconds spent, error or None). Bridge errors are raised, so that the
+# pool gets to restart the office and retry the paper.
+def timedFormatPaper(desktop, smgr, paperDir):
+    start = time.monotonic()
+    try:
+        formatPaper(desktop, paperDir)
+        return (time.monotonic() - start, None)
+    except bridgeErrors():
+        raise
+    except Exception as e:
+        return (time.monotonic() - start, e)
+
+# Future -> (Float, error or None); same as timedFormatPaper returns, also when the
+# paper failed on the restarted office too. The time isn't known then.
+def paperResult(future):
+    try:
+        return future.result()
+    except Exception as e:
+        return (float('nan'), e)
+
+def printSummary(papers, results, elapsed):
+    print("{:>8}  {}".format("seconds", "paper"))
+    for paper, (seconds, error) in zip(papers, results):
+        print("{:>8.1f}  {}{}".format(seconds, paper,
+                                      "" if error is None else "  FAILED: " + str(error)))
+    nFailed = sum(1 for (_, error) in results if error is not None)
+    print("{} papers in {:.1f} seconds, {} failed".format(len(papers), elapsed, nFailed))
+
+# script [--jobs N] [paper_dir|dir_of_papers|manifest...]
+# Without paper args formats the paper in the current dir using the office
+# listening on PORT; otherwise starts headless offices on ports since POOL_PORT and
+# formats papers in parallel.
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                        help="number of offices to run papers on")
+    parser.add_argument('papers', nargs='*')
+    args = parser.parse_args()
+
+    if not args.papers:
+        (desktop, smgr) = connectToLO(PORT)
+        formatPaper(desktop, '.')
+    else:
+        papers = collectPapers(args.papers)
+        start = time.monotonic()
+        with OfficePool(min(args.jobs, len(papers)) or 1, POOL_PORT) as pool:
+            futures = [pool.submit(timedFormatPaper, paper) for paper in papers]
+            results = [paperResult(future) for future in futures]
+        printSummary(papers, results, time.monotonic() - start)
+
+    print("Not implemented: removing Appendinx entries from the end of TOC")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!python
+# Connecting to LibreOffice, shared by the scripts. Besides connecting to an office
+# the user runs, it can start a pool of headless offices and hand jobs out to them,
+# so several documents get processed in parallel. Also has helpers to open
+# documents hidden and locked for bulk edits.
+import os
+import importlib.util
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+import uno
+from uno_trace import traced
+
+DEFAULT_PORT    = 2002
+POOL_PORT       = 2010 # pooled offices go on ports since here, away from DEFAULT_PORT
+STARTUP_TIMEOUT = 60 # seconds for a freshly started soffice to accept connections
+STOP_TIMEOUT    = 10
+
+# String -> module; imports one of the scripts of this repo, which can't be
+# imported the usual way because of dashes in their names
+def loadScript(filename):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# run libreoffice as:
+# soffice --calc --accept="socket,host=localhost,port=2002;urp;StarOffice.ServiceManager"
+def connectToLO(port = DEFAULT_PORT, host = 'localhost'):
+    # get the uno component context from the PyUNO runtime
+    localContext = uno.getComponentContext()
+    resolver = localContext.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", localContext )
+    # connect to the running office
+    ctx = resolver.resolve("uno:socket,host={},port={};urp;StarOffice.ComponentContext"
+                           .format(host, port))
+    smgr = ctx.ServiceManager
+    desktop = smgr.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+    return (traced(desktop), traced(smgr)) # see uno_trace, it's a no-op by default
+
+# same as connectToLO, but waits for the office to start listening. If `process`
+# is given, that's the office being waited for, and it exiting is an error.
+def connectWithRetries(port, timeout, host = 'localhost', process = None):
+    NoConnectException = uno.getClass("com.sun.star.connection.NoConnectException")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return connectToLO(port, host)
+        except NoConnectException:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError("soffice exited with code {} before accepting connections"
+                                   .format(process.returncode))
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+# whether nothing listens on `port`, so that an office started there would be ours
+def isPortFree(port, host = 'localhost'):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # TIME_WAIT is fine
+        try:
+            sock.bind((host, port))
+            return True
+        except OSError:
+            return False
+
+def propertyValue(name, value):
+    prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+    prop.Name  = name
+    prop.Value = value
+    return prop
+
+def loadHidden(desktop, url):
+    return desktop.loadComponentFromURL(url, "_blank", 0, (propertyValue("Hidden", True),))
+
+def closeDocument(document):
+    try:
+        document.close(True)
+    except AttributeError: # not an XCloseable
+        document.dispose()
+
+@contextmanager
+def editSession(document):
+    """Locks `document` for a bulk edit: controllers don't repaint, layouting is
+    postponed where the document supports action locks, and undo isn't recorded.
+    Everything gets restored at exit."""
+    document.lockControllers()
+    hasActionLock = hasattr(document, 'addActionLock')
+    if hasActionLock:
+        document.addActionLock()
+    undoManager = document.UndoManager
+    undoManager.lock()
+    try:
+        yield document
+    finally:
+        undoManager.unlock()
+        if hasActionLock:
+            document.removeActionLock()
+        document.unlockControllers()
+
+@contextmanager
+def openedForEdit(desktop, urls):
+    """Loads documents at `urls` hidden, and keeps them in editSession. The
+    documents get closed at exit, so whatever needs saving must be saved inside.
+
+    Usage:
+        with openedForEdit(desktop, [url1, url2]) as (doc1, doc2):
+            ...
+    """
+    with ExitStack() as stack:
+        documents = []
+        for url in urls:
+            document = loadHidden(desktop, url)
+            stack.callback(closeDocument, document)
+            stack.enter_context(editSession(document))
+            documents.append(document)
+        yield documents
+
+# exceptions meaning the bridge to the office is gone
+def bridgeErrors():
+    return (uno.getClass("com.sun.star.lang.DisposedException"),
+            uno.getClass("com.sun.star.uno.RuntimeException"),
+            uno.getClass("com.sun.star.connection.NoConnectException"))
+
+class Office:
+    """A headless soffice listening on `port`. Every office gets its own user
+    profile, otherwise a second soffice would just forward to the first one."""
+    def __init__(self, port, soffice = 'soffice'):
+        self.port    = port
+        self.soffice = soffice
+        self.process = None
+        self.profileDir = None
+        self.desktop = None
+        self.smgr    = None
+
+    def start(self):
+        if not isPortFree(self.port):
+            raise RuntimeError("port {} is taken, is another office listening there?"
+                               .format(self.port))
+        self.profileDir = tempfile.mkdtemp(prefix='lo-profile-')
+        try:
+            self.process = subprocess.Popen(
+                [self.soffice, '--headless', '--invisible', '--nologo', '--norestore',
+                 '--nodefault', '-env:UserInstallation=file://' + self.profileDir,
+                 '--accept=socket,host=localhost,port={};urp;StarOffice.ServiceManager'
+                 .format(self.port)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            (self.desktop, self.smgr) = connectWithRetries(self.port, STARTUP_TIMEOUT,
+                                                           process = self.process)
+        except BaseException:
+            self.stop() # don't leave a half-started soffice and its profile behind
+            raise
+
+    def isAlive(self):
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    # also cleans up after a start() that failed halfway, and is a no-op if not started
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass # the bridge may already be dead, or was never made; it's fine
+            try:
+                self.process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.profileDir is not None:
+            shutil.rmtree(self.profileDir, ignore_errors=True)
+        self.process = None
+        self.profileDir = None
+        self.desktop = None
+        self.smgr    = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+class OfficePool:
+    """Starts `nOffices` headless offices on ports since `basePort`, and runs jobs
+    on them, one job per office at a time. A job is a function called as
+    `job(desktop, smgr, *args)`. If the office dies during a job, the office gets
+    restarted and the job is retried once. If the restart fails, the office is
+    started again before its next job.
+
+    Usage:
+        with OfficePool(4) as pool:
+            results = pool.map(job, [(arg1,), (arg2,)])
+    """
+    def __init__(self, nOffices = os.cpu_count(), basePort = POOL_PORT,
+                 soffice = 'soffice'):
+        self.offices  = [Office(basePort + i, soffice) for i in range(nOffices)]
+        self.idle     = queue.Queue()
+        self.executor = None
+
+    def __enter__(self):
+        try:
+            with ThreadPoolExecutor(len(self.offices)) as starter:
+                list(starter.map(Office.start, self.offices))
+        except BaseException: # __exit__ won't run, stop the offices that did start
+            for office in self.offices:
+                office.stop()
+            raise
+        for office in self.offices:
+            self.idle.put(office)
+        self.executor = ThreadPoolExecutor(len(self.offices))
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown()
+        for office in self.offices:
+            office.stop()
+
+    def _runOn(self, office, job, args):
+        if office.desktop is None: # stopped by a failed restart
+            office.start()
+        try:
+            return job(office.desktop, office.smgr, *args)
+        except bridgeErrors():
+            if office.isAlive():
+                raise
+        office.restart()
+        return job(office.desktop, office.smgr, *args)
+
+    def _run(self, job, args):
+        office = self.idle.get()
+        try:
+            return self._runOn(office, job, args)
+        finally:
+            self.idle.put(office)
+
+    # returns a Future
+    def submit(self, job, *args):
+        return self.executor.submit(self._run, job, args)
+
+    # (Desktop -> ServiceManager -> args.. -> a) -> [args] -> [a]
+    def map(self, job, argsList):
+        futures = [self.submit(job, *args) for args in argsList]
+        return [future.result() for future in futures]
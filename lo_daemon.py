@@ -0,0 +1,274 @@
+#!/usr/bin/python3
+# A long-running service for the scripts, so that small jobs don't pay for
+# connecting to the office and loading templates every time. It holds one UNO
+# connection, keeps template documents (the sample presentation, styles.odt) open
+# hidden, and reloads a template once its file changes on disk. Jobs come as JSON
+# over a Unix socket, one per line, or as *.json files dropped into a directory.
+#
+# lo_daemon.py serve [--socket PATH] [--jobs-dir DIR] [--port N] [--start-office]
+# lo_daemon.py submit [--socket PATH] '{"kind": "paper", "paper": "/path/to/paper"}'
+#
+# Jobs:
+#   {"kind": "influencers", "sample": ..., "spreadsheet": ..., "dst": ...,
+#    "ranking": "impressions"|"publishers", "backend": "uno"|"odf"}
+#   {"kind": "paper", "paper": ..., "styles": ...}
+# "ranking", "backend" and "styles" are optional. Relative paths are resolved
+# against the working dir of the daemon. Every job gets a reply like
+# {"ok": true, "seconds": 1.2} or {"ok": false, "error": "..."}.
+#
+# In the jobs dir a job is picked up once its name ends with .json, so write it
+# under another name and rename it. When done, the job is moved to done/ or
+# failed/ inside the dir, with the reply added under "result".
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uno
+from lo_connect import (DEFAULT_PORT, STARTUP_TIMEOUT, Office, bridgeErrors, closeDocument,
+                        connectWithRetries, loadHidden, loadScript, openedForEdit)
+
+oxana = loadScript('oxana-influencers-calc-to-impress.py')
+paper = loadScript('format-student-paper.py')
+
+DEFAULT_SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'lo-daemon.sock')
+POLL_INTERVAL  = 0.5 # seconds between looks into the jobs dir
+
+# String -> (Int, Int); changes whenever the file gets rewritten
+def fileStamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def fileUrl(path):
+    return uno.systemPathToFileUrl(os.path.abspath(path))
+
+class TemplateCache:
+    """Documents loaded hidden and kept open between jobs, by path. A document is
+    loaded again when the file's mtime or size differ from when it was loaded.
+    Cached documents must only be read, jobs never store them."""
+    def __init__(self):
+        self.documents = {} # {String: ((Int, Int), Document)}; path -> stamp, document
+
+    def get(self, desktop, path):
+        path = os.path.abspath(path)
+        stamp = fileStamp(path)
+        cached = self.documents.get(path)
+        if cached is not None:
+            if cached[0] == stamp:
+                return cached[1]
+            print("{} changed on disk, reloading".format(path), file=sys.stderr)
+            self.close(path)
+        document = loadHidden(desktop, fileUrl(path))
+        self.documents[path] = (stamp, document)
+        return document
+
+    def close(self, path):
+        (_, document) = self.documents.pop(path)
+        try:
+            closeDocument(document)
+        except bridgeErrors():
+            pass # went away along with the office
+
+    def closeAll(self):
+        for path in list(self.documents):
+            self.close(path)
+
+    # drops the documents without closing them, for when the office is gone
+    def forget(self):
+        self.documents = {}
+
+def requiredPath(job, key):
+    if key not in job:
+        raise ValueError("job misses '{}'".format(key))
+    return os.path.abspath(job[key])
+
+class Daemon:
+    """Runs jobs one at a time on a single office connection. If the bridge breaks
+    during a job, i.e. a bridge error is raised and the office doesn't respond
+    anymore, the daemon reconnects (restarting the office if it started it), and
+    retries the job once."""
+    def __init__(self, port = DEFAULT_PORT, startOffice = False):
+        self.port     = port
+        self.office   = Office(port) if startOffice else None
+        self.desktop  = None
+        self.lock     = threading.Lock()
+        self.templates = TemplateCache()
+        self.handlers = {'influencers': self.runInfluencers,
+                         'paper':       self.runPaper}
+
+    def start(self):
+        if self.office is not None:
+            self.office.start()
+            self.desktop = self.office.desktop
+        else:
+            self.desktop = connectWithRetries(self.port, STARTUP_TIMEOUT)[0]
+
+    def stop(self):
+        with self.lock:
+            self.templates.closeAll()
+            if self.office is not None:
+                self.office.stop()
+
+    def isAlive(self):
+        if self.office is not None:
+            return self.office.isAlive()
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def reconnect(self):
+        self.templates.forget()
+        if self.office is not None:
+            self.office.restart()
+            self.desktop = self.office.desktop
+        else:
+            self.desktop = connectWithRetries(self.port, STARTUP_TIMEOUT)[0]
+
+    def runInfluencers(self, job):
+        (sample, spreadsheet, dst) = (requiredPath(job, 'sample'),
+                                      requiredPath(job, 'spreadsheet'), requiredPath(job, 'dst'))
+        rankingName = job.get('ranking', 'impressions')
+        backend = job.get('backend', 'uno')
+        if rankingName not in ('impressions', 'publishers') or backend not in ('uno', 'odf'):
+            raise ValueError("bad ranking or backend: {}, {}".format(rankingName, backend))
+
+        (influencersSorted, publishersSorted) = oxana.collectRankingsFromFile(self.desktop,
+                                                                               spreadsheet)
+        ranking = influencersSorted if rankingName == 'impressions' else publishersSorted
+        if backend == 'odf':
+            oxana.buildSlidesOdf(sample, dst, ranking)
+            return
+        sampleApp = self.templates.get(self.desktop, sample)
+        with openedForEdit(self.desktop, [fileUrl(dst)]) as (dstApp,):
+            oxana.buildSlides(sampleApp, dstApp, ranking)
+            dstApp.store()
+
+    def runPaper(self, job):
+        stylesDocument = self.templates.get(self.desktop, job.get('styles', paper.STYLESFILE))
+        paper.formatPaper(self.desktop, requiredPath(job, 'paper'), stylesDocument)
+
+    # {String: a} -> {String: a}; the reply, errors of the job are reported in it
+    def run(self, job):
+        start = time.monotonic()
+        try:
+            handler = self.handlers.get(job.get('kind')) if isinstance(job, dict) else None
+            if handler is None:
+                raise ValueError("unknown job: {}".format(job))
+            with self.lock:
+                try:
+                    handler(job)
+                except bridgeErrors():
+                    if self.isAlive(): # the office still responds, so the error is the job's
+                        raise
+                    print("lost the office, reconnecting", file=sys.stderr)
+                    self.reconnect()
+                    handler(job)
+            return {'ok': True, 'seconds': time.monotonic() - start}
+        except Exception as e:
+            return {'ok': False, 'seconds': time.monotonic() - start,
+                    'error': "{}: {}".format(type(e).__name__, e)}
+
+class JobRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                reply = self.server.daemon.run(json.loads(line))
+            except ValueError as e: # not JSON
+                reply = {'ok': False, 'error': "bad job: {}".format(e)}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+class JobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, daemon):
+        if os.path.exists(path):
+            os.remove(path) # left over from a daemon that was killed
+        super().__init__(path, JobRequestHandler)
+        self.daemon = daemon
+
+# runs the *.json jobs appearing in `jobsDir` till `stopped` is set
+def watchJobsDir(daemon, jobsDir, stopped):
+    for subdir in ('done', 'failed'):
+        os.makedirs(os.path.join(jobsDir, subdir), exist_ok=True)
+    while not stopped.is_set():
+        for name in sorted(os.listdir(jobsDir)):
+            path = os.path.join(jobsDir, name)
+            if not name.endswith('.json') or not os.path.isfile(path):
+                continue
+            try:
+                with open(path) as jobFile:
+                    job = json.load(jobFile)
+                reply = daemon.run(job)
+            except ValueError as e:
+                (job, reply) = (None, {'ok': False, 'error': "bad job: {}".format(e)})
+            with open(os.path.join(jobsDir, 'done' if reply['ok'] else 'failed', name), 'w') as out:
+                json.dump({'job': job, 'result': reply}, out, ensure_ascii=False, indent=1)
+            os.remove(path)
+        stopped.wait(POLL_INTERVAL)
+
+def serve(args):
+    if args.socket is None and args.jobs_dir is None:
+        args.socket = DEFAULT_SOCKET
+    daemon = Daemon(args.port, args.start_office)
+    daemon.start()
+    stopped = threading.Event()
+    watcher = None
+    if args.jobs_dir is not None:
+        watcher = threading.Thread(target=watchJobsDir, args=(daemon, args.jobs_dir, stopped))
+        watcher.start()
+    try:
+        if args.socket is not None:
+            with JobServer(args.socket, daemon) as server:
+                print("listening on " + args.socket, file=sys.stderr)
+                try:
+                    server.serve_forever()
+                finally:
+                    os.remove(args.socket)
+        else:
+            watcher.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopped.set()
+        if watcher is not None:
+            watcher.join()
+        daemon.stop()
+
+def submit(args):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(args.socket or DEFAULT_SOCKET)
+        sock.sendall((json.dumps(json.loads(args.job)) + '\n').encode())
+        reply = sock.makefile().readline()
+    print(reply, end='')
+    return 0 if json.loads(reply)['ok'] else 1
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    serveParser = commands.add_parser('serve', help="run the daemon")
+    serveParser.add_argument('--socket', help="Unix socket to accept jobs on, default "
+                             + DEFAULT_SOCKET + " unless --jobs-dir is given")
+    serveParser.add_argument('--jobs-dir', help="dir to pick *.json jobs from")
+    serveParser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                             help="port of the office to connect to")
+    serveParser.add_argument('--start-office', action='store_true',
+                             help="start a headless office on --port instead of connecting"
+                             " to a running one")
+    submitParser = commands.add_parser('submit', help="send a job to a running daemon")
+    submitParser.add_argument('--socket')
+    submitParser.add_argument('job', help="the job as JSON")
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+    else:
+        sys.exit(submit(args))
+
+if __name__ == "__main__":
+    main()
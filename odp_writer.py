@@ -0,0 +1,329 @@
+#!python
+# Writing table slides straight into .odp packages, without an office. Template
+# slides are taken from a sample presentation as ODF XML, copied into the
+# destination along with automatic styles, table templates and pictures they
+# use, and their tables get filled with rows.
+import os
+import copy
+import mimetypes
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+import table_plan
+
+NS = {
+    'office':       'urn:oasis:names:tc:opendocument:xmlns:office:1.0',
+    'style':        'urn:oasis:names:tc:opendocument:xmlns:style:1.0',
+    'text':         'urn:oasis:names:tc:opendocument:xmlns:text:1.0',
+    'table':        'urn:oasis:names:tc:opendocument:xmlns:table:1.0',
+    'draw':         'urn:oasis:names:tc:opendocument:xmlns:drawing:1.0',
+    'presentation': 'urn:oasis:names:tc:opendocument:xmlns:presentation:1.0',
+    'xlink':        'http://www.w3.org/1999/xlink',
+    'xml':          'http://www.w3.org/XML/1998/namespace',
+    'manifest':     'urn:oasis:names:tc:opendocument:xmlns:manifest:1.0',
+}
+
+def qname(prefixed):
+    (prefix, name) = prefixed.split(':')
+    return '{' + NS[prefix] + '}' + name
+
+def localName(tag):
+    return tag.rpartition('}')[2]
+
+DRAW_PAGE      = qname('draw:page')
+DRAW_FRAME     = qname('draw:frame')
+TABLE          = qname('table:table')
+TABLE_ROW      = qname('table:table-row')
+TABLE_CELL     = qname('table:table-cell')
+COVERED_CELL   = qname('table:covered-table-cell')
+TEXT_P         = qname('text:p')
+TEXT_SPAN      = qname('text:span')
+STYLE_NAME     = qname('style:name')
+PAGE_NAME      = qname('draw:name')
+MASTER_NAME    = qname('draw:master-page-name')
+LAYOUT_NAME    = qname('presentation:presentation-page-layout-name')
+TEMPLATE_NAME  = qname('table:template-name')
+TABLE_NAME     = qname('table:name')
+TABLE_TEMPLATE = qname('table:table-template')
+HREF           = qname('xlink:href')
+ID_ATTRS       = {qname('xml:id'), qname('draw:id')}
+# attributes referring to ids of shapes, e.g. from animations and connectors
+ID_REF_ATTRS   = {'targetElement', 'start-shape', 'end-shape', 'shape-id'}
+
+N_COLUMNS_FILLED = 3 # columns 1..3, the 0-th one holds numbering from the template
+
+class OdfPackage:
+    """A .odp opened for modification: content.xml, styles.xml and manifest.xml are
+    parsed, other entries are copied as is on save()"""
+    def __init__(self, path):
+        self.path = path
+        self.zip  = zipfile.ZipFile(path)
+        self.namespaces = {}
+        self.trees = {name: self.parse(name)
+                      for name in ['content.xml', 'styles.xml', 'META-INF/manifest.xml']}
+        self.extraEntries = {} # {String: bytes}; files added to the package
+
+    def parse(self, name):
+        with self.zip.open(name) as f:
+            events = ET.iterparse(f, events=('start-ns',))
+            self.namespaces[name] = [ns for (_, ns) in events]
+            return ET.ElementTree(events.root)
+
+    def root(self, name):
+        return self.trees[name].getroot()
+
+    def serialize(self, name):
+        for (prefix, uri) in self.namespaces[name]:
+            if prefix:
+                ET.register_namespace(prefix, uri)
+        data = ET.tostring(self.root(name), encoding='UTF-8', xml_declaration=True)
+        # ElementTree only declares namespaces used in tags and attribute names, but
+        # ODF also uses prefixes in attribute values, e.g. script:event-name="dom:click"
+        declEnd = data.index(b'?>') + 2
+        rootEnd = data.index(b'>', data.index(b'<', declEnd))
+        rootTag = data[declEnd:rootEnd]
+        missing = b''.join(b' xmlns:' + prefix.encode() + b'="' + uri.encode() + b'"'
+                           for (prefix, uri) in self.namespaces[name]
+                           if prefix and b'xmlns:' + prefix.encode() + b'=' not in rootTag)
+        return data[:rootEnd] + missing + data[rootEnd:]
+
+    def hasEntry(self, name):
+        return name in self.extraEntries or name in self.zip.namelist()
+
+    def save(self, path):
+        # mimetype has to be the first entry, and uncompressed
+        (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                         suffix='.odp')
+        os.close(fd)
+        with zipfile.ZipFile(tmpPath, 'w', zipfile.ZIP_DEFLATED) as out:
+            out.writestr('mimetype', self.zip.read('mimetype'), zipfile.ZIP_STORED)
+            for info in self.zip.infolist():
+                if info.filename == 'mimetype':
+                    continue
+                if info.filename in self.trees:
+                    out.writestr(info.filename, self.serialize(info.filename))
+                else:
+                    out.writestr(info, self.zip.read(info.filename))
+            for name, data in self.extraEntries.items():
+                out.writestr(name, data)
+        self.zip.close()
+        os.replace(tmpPath, path)
+
+    def pages(self):
+        return self.root('content.xml').findall('.//' + DRAW_PAGE)
+
+    def presentation(self):
+        return self.root('content.xml').find('.//' + qname('office:presentation'))
+
+# Element -> [Element]; tables of a slide, in document order
+def tablesOfPage(page):
+    return [table for frame in page.iter(DRAW_FRAME) for table in frame.findall(TABLE)]
+
+# Element -> Int; rows that may be filled, i.e. all but the header
+def tableCapacity(table):
+    return max(len(list(table.iter(TABLE_ROW))) - 1, 0)
+
+def setCellText(cell, string):
+    paragraphs = cell.findall(TEXT_P)
+    if not paragraphs:
+        paragraphs = [ET.SubElement(cell, TEXT_P)]
+    for extra in paragraphs[1:]:
+        cell.remove(extra)
+    par = paragraphs[0]
+    span = par.find(TEXT_SPAN) # keeps the character formatting of the template
+    for child in list(par):
+        if child is not span:
+            par.remove(child)
+    if span is not None:
+        for child in list(span):
+            span.remove(child)
+        par.text = None
+        span.text = string
+        span.tail = None
+    else:
+        par.text = string
+
+# Element -> [[String]] -> (); the header row is kept, `rows` go after it, and the
+# rest of the table gets blanked
+def fillTable(table, rows):
+    for iRow, tableRow in enumerate(table.iter(TABLE_ROW)):
+        if iRow == 0:
+            continue
+        contents = rows[iRow - 1] if iRow - 1 < len(rows) else [''] * N_COLUMNS_FILLED
+        cells = [cell for cell in tableRow if cell.tag in (TABLE_CELL, COVERED_CELL)]
+        for iCol, string in enumerate(contents, start = 1):
+            if iCol < len(cells) and cells[iCol].tag == TABLE_CELL:
+                setCellText(cells[iCol], string)
+
+class TemplateCopier:
+    """Copies slides of a sample package into a destination one, taking along the
+    automatic styles (renamed, so they don't clash), table templates and pictures
+    the slides use"""
+    def __init__(self, sample, dst):
+        self.sample = sample
+        self.dst    = dst
+        self.nCopies = 0
+        self.dstMasters = [master.get(STYLE_NAME) for master in
+                           dst.root('styles.xml').iter(qname('style:master-page'))]
+        self.dstLayouts = {layout.get(STYLE_NAME) for layout in
+                           dst.root('styles.xml').iter(qname('style:presentation-page-layout'))}
+        self.dstPageNames = {page.get(PAGE_NAME) for page in dst.pages()}
+        self.styleNames = self.copyAutomaticStyles()
+        self.copiedTemplates = set()
+        self.copiedPictures = {} # {String: String}; sample path -> dst path
+
+    # copies all automatic styles of sample to dst, returns old name -> new name
+    def copyAutomaticStyles(self):
+        srcStyles = self.sample.root('content.xml').find(qname('office:automatic-styles'))
+        dstStyles = self.dst.root('content.xml').find(qname('office:automatic-styles'))
+        if srcStyles is None:
+            return {}
+        if dstStyles is None:
+            dstStyles = ET.Element(qname('office:automatic-styles'))
+            self.dst.root('content.xml').insert(0, dstStyles)
+        taken = {style.get(STYLE_NAME) for style in dstStyles}
+        renames = {}
+        for style in srcStyles:
+            name = style.get(STYLE_NAME)
+            if name is None:
+                continue
+            newName = 'tpl' + name
+            while newName in taken:
+                newName = 'tpl' + newName
+            taken.add(newName)
+            renames[name] = newName
+        for style in srcStyles:
+            renamed = self.withStylesRenamed(style, renames)
+            if renamed.get(STYLE_NAME) in renames.values():
+                dstStyles.append(renamed)
+        return renames
+
+    @staticmethod
+    def withStylesRenamed(elem, renames):
+        ret = copy.deepcopy(elem)
+        for node in ret.iter():
+            for attr, val in node.attrib.items():
+                if localName(attr).endswith('style-name') or attr == STYLE_NAME:
+                    if val in renames:
+                        node.set(attr, renames[val])
+        return ret
+
+    def copyTableTemplate(self, name):
+        if name in self.copiedTemplates:
+            return
+        self.copiedTemplates.add(name)
+        dstOfficeStyles = self.dst.root('styles.xml').find(qname('office:styles'))
+        if any(t.get(TABLE_NAME) == name for t in dstOfficeStyles.iter(TABLE_TEMPLATE)):
+            return
+        srcOfficeStyles = self.sample.root('styles.xml').find(qname('office:styles'))
+        template = next((t for t in srcOfficeStyles.iter(TABLE_TEMPLATE)
+                         if t.get(TABLE_NAME) == name), None)
+        if template is None:
+            return
+        dstStyleNames = {s.get(STYLE_NAME) for s in dstOfficeStyles}
+        wanted = {node.get(qname('table:style-name')) for node in template.iter()} - {None}
+        for style in srcOfficeStyles:
+            if style.get(STYLE_NAME) in wanted and style.get(STYLE_NAME) not in dstStyleNames:
+                dstOfficeStyles.append(copy.deepcopy(style))
+        dstOfficeStyles.append(copy.deepcopy(template))
+
+    def copyPicture(self, href):
+        if href in self.copiedPictures:
+            return self.copiedPictures[href]
+        if href not in self.sample.zip.namelist():
+            return href # external link, or something we don't know about
+        (dirName, baseName) = os.path.split(href)
+        newHref = href
+        while self.dst.hasEntry(newHref):
+            baseName = 'tpl' + baseName
+            newHref = os.path.join(dirName, baseName)
+        self.dst.extraEntries[newHref] = self.sample.zip.read(href)
+        manifest = self.dst.root('META-INF/manifest.xml')
+        entry = ET.SubElement(manifest, qname('manifest:file-entry'))
+        entry.set(qname('manifest:full-path'), newHref)
+        entry.set(qname('manifest:media-type'), mimetypes.guess_type(newHref)[0] or '')
+        self.copiedPictures[href] = newHref
+        return newHref
+
+    def uniquePageName(self, name):
+        newName = name
+        i = 1
+        while newName in self.dstPageNames:
+            i += 1
+            newName = '{} {}'.format(name, i)
+        self.dstPageNames.add(newName)
+        return newName
+
+    # Element -> Element; a copy of a sample slide suitable for dst
+    def copyPage(self, page):
+        self.nCopies += 1
+        page = self.withStylesRenamed(page, self.styleNames)
+        if page.get(MASTER_NAME) not in self.dstMasters and self.dstMasters:
+            page.set(MASTER_NAME, self.dstMasters[0])
+        if page.get(LAYOUT_NAME) is not None and page.get(LAYOUT_NAME) not in self.dstLayouts:
+            del page.attrib[LAYOUT_NAME]
+        if page.get(PAGE_NAME) is not None:
+            page.set(PAGE_NAME, self.uniquePageName(page.get(PAGE_NAME)))
+        ids = {}
+        for node in page.iter():
+            for attr in ID_ATTRS & set(node.attrib):
+                ids[node.get(attr)] = '{}_c{}'.format(node.get(attr), self.nCopies)
+                node.set(attr, ids[node.get(attr)])
+            if node.get(TEMPLATE_NAME) is not None:
+                self.copyTableTemplate(node.get(TEMPLATE_NAME))
+            if node.get(HREF) is not None:
+                node.set(HREF, self.copyPicture(node.get(HREF)))
+        for node in page.iter():
+            for attr, val in node.attrib.items():
+                if localName(attr) in ID_REF_ATTRS and val in ids:
+                    node.set(attr, ids[val])
+        return page
+
+# Element -> [Int] -> [[String]] -> [[String]]; fills tables of a slide copy,
+# returns the rows left. Tables getting no rows are removed if `dropUnused`.
+def fillPage(page, counts, rows, dropUnused):
+    for (iTable, table) in enumerate(tablesOfPage(page)):
+        count = counts[iTable] if iTable < len(counts) else 0
+        if count == 0 and dropUnused:
+            frame = next(f for f in page.iter(DRAW_FRAME) if table in list(f))
+            parent = next(p for p in page.iter() if frame in list(p))
+            parent.remove(frame)
+            continue
+        fillTable(table, rows[:count])
+        rows = rows[count:]
+    return rows
+
+# Writes the top table slide and as many tail ones as `rows` need into the dst
+# presentation after the slide number `insertAfter`; the same slides the UNO path
+# in oxana-influencers-calc-to-impress.py makes. The result is saved to
+# `outPath`, which may be the same as `dstPath`.
+# sample: presentation with the top table slide first and the tail one second
+# rows: [[String]], contents of columns 1..3 for every ranked row
+def writeTableSlides(samplePath, dstPath, outPath, rows, insertAfter = 0):
+    sample = OdfPackage(samplePath)
+    dst    = OdfPackage(dstPath)
+    samplePages = sample.pages()
+    (topSample, tailSample) = (samplePages[0], samplePages[1])
+    plan = table_plan.planTableRows([tableCapacity(t) for t in tablesOfPage(topSample)],
+                                    [tableCapacity(t) for t in tablesOfPage(tailSample)],
+                                    len(rows))
+    copier = TemplateCopier(sample, dst)
+    newPages = []
+    for (iSlide, counts) in enumerate(plan):
+        page = copier.copyPage(topSample if iSlide == 0 else tailSample)
+        rows = fillPage(page, counts, rows, dropUnused = iSlide != 0)
+        newPages.append(page)
+    presentation = dst.presentation()
+    children = list(presentation)
+    dstPages = [child for child in children if child.tag == DRAW_PAGE]
+    insertAt = children.index(dstPages[insertAfter]) + 1 if dstPages else 0
+    for (i, page) in enumerate(newPages):
+        presentation.insert(insertAt + i, page)
+    sample.zip.close()
+    dst.save(outPath)
+    return len(plan)
+
+# (String, String, String, [[String]]) -> Int; for running writeTableSlides in a
+# process pool, e.g. ProcessPoolExecutor().map(writeTableSlidesJob, jobs)
+def writeTableSlidesJob(job):
+    return writeTableSlides(*job)
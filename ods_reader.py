@@ -0,0 +1,169 @@
+#!python
+# Reading data out of .ods files without an office. content.xml is parsed
+# incrementally, and rows are dropped as soon as they're processed, so memory use
+# doesn't depend on the spreadsheet size.
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+TABLE_NS  = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+TEXT_NS   = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+def tableTag(name):
+    return '{' + TABLE_NS + '}' + name
+
+def officeAttr(name):
+    return '{' + OFFICE_NS + '}' + name
+
+TABLE            = tableTag('table')
+TABLE_ROW        = tableTag('table-row')
+TABLE_CELL       = tableTag('table-cell')
+COVERED_CELL     = tableTag('covered-table-cell')
+DATA_PILOT_TABLE = tableTag('data-pilot-table')
+DATA_PILOT_FIELD = tableTag('data-pilot-field')
+SOURCE_RANGE     = tableTag('source-cell-range')
+TEXT_P           = '{' + TEXT_NS + '}p'
+NUMERIC_TYPES    = {'float', 'percentage', 'currency'}
+
+# String -> Iter (Element, [Element]); yields elements of content.xml once they're
+# parsed completely, along with their ancestors. Rows are detached once yielded.
+def streamContent(odsPath):
+    with zipfile.ZipFile(odsPath) as ods, ods.open('content.xml') as content:
+        ancestors = []
+        for event, elem in ET.iterparse(content, events=('start', 'end')):
+            if event == 'start':
+                ancestors.append(elem)
+                continue
+            ancestors.pop()
+            yield (elem, ancestors)
+            if elem.tag == TABLE_ROW:
+                ancestors[-1].remove(elem)
+
+# Element -> a; floats for numeric cells, strings otherwise, '' for empty ones
+def cellValue(cell):
+    valueType = cell.get(officeAttr('value-type'))
+    if valueType in NUMERIC_TYPES:
+        return float(cell.get(officeAttr('value')))
+    if valueType == 'boolean':
+        return cell.get(officeAttr('boolean-value')) == 'true'
+    if valueType == 'date':
+        return cell.get(officeAttr('date-value'))
+    if valueType == 'time':
+        return cell.get(officeAttr('time-value'))
+    return '\n'.join(''.join(p.itertext()) for p in cell.iter(TEXT_P))
+
+# Element -> [a]; with repeated cells expanded, and trailing empty cells dropped
+def rowValues(row):
+    values = []
+    nTrailingEmpty = 0
+    for cell in row:
+        if cell.tag not in (TABLE_CELL, COVERED_CELL):
+            continue
+        val = cellValue(cell)
+        nRepeated = int(cell.get(tableTag('number-columns-repeated'), 1))
+        if val == '':
+            nTrailingEmpty += nRepeated
+            continue
+        values += [''] * nTrailingEmpty + [val] * nRepeated
+        nTrailingEmpty = 0
+    return values
+
+# String -> String -> Iter [a]; rows of the sheet, with repeated rows expanded.
+# Empty rows at the end of the sheet (often repeated a million times) are dropped.
+def iterSheetRows(odsPath, sheetName):
+    nPendingEmpty = 0
+    for (elem, ancestors) in streamContent(odsPath):
+        if elem.tag == TABLE and elem.get(tableTag('name')) == sheetName:
+            return
+        if elem.tag != TABLE_ROW or not any(a.tag == TABLE and a.get(tableTag('name')) == sheetName
+                                            for a in ancestors):
+            continue
+        values = rowValues(elem)
+        nRepeated = int(elem.get(tableTag('number-rows-repeated'), 1))
+        if not values:
+            nPendingEmpty += nRepeated
+            continue
+        for _ in range(nPendingEmpty):
+            yield []
+        nPendingEmpty = 0
+        for _ in range(nRepeated):
+            yield values
+
+# String -> Int; "A" -> 0, "AB" -> 27
+def columnIndex(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+CELL_ADDRESS = r"\$?(?:'((?:[^']|'')+)'|([^.']*))\.\$?([A-Z]+)\$?(\d+)"
+RANGE_ADDRESS_RE = re.compile('^' + CELL_ADDRESS + ':' + CELL_ADDRESS + '$')
+
+class CellRange:
+    """A range parsed from ODF notation such as "Sheet1.A1:Sheet1.D500", columns
+    and rows are 0-based and inclusive"""
+    def __init__(self, address):
+        match = RANGE_ADDRESS_RE.match(address)
+        if match is None:
+            raise ValueError("Can't parse cell range address: " + address)
+        (quoted, plain, startCol, startRow, _, _, endCol, endRow) = match.groups()
+        self.sheet    = quoted.replace("''", "'") if quoted is not None else plain
+        self.startCol = columnIndex(startCol)
+        self.startRow = int(startRow) - 1
+        self.endCol   = columnIndex(endCol)
+        self.endRow   = int(endRow) - 1
+
+class PivotSource:
+    """Where the data of a DataPilot table comes from: the source range and the
+    source columns of its fields by orientation"""
+    def __init__(self, sourceRange, fields):
+        self.sourceRange = sourceRange
+        self.fields = fields # [(String, String)]: source field name, orientation
+
+    def fieldsOf(self, orientation):
+        return [name for (name, fieldOrientation) in self.fields
+                if fieldOrientation == orientation]
+
+# String -> String -> PivotSource; of the first DataPilot table placed on `pivotSheet`
+def findPivotSource(odsPath, pivotSheet):
+    for (elem, _) in streamContent(odsPath):
+        if elem.tag != DATA_PILOT_TABLE:
+            continue
+        target = CellRange(elem.get(tableTag('target-range-address')))
+        source = elem.find(SOURCE_RANGE)
+        if target.sheet != pivotSheet or source is None:
+            continue
+        fields = [(field.get(tableTag('source-field-name')), field.get(tableTag('orientation')))
+                  for field in elem.iter(DATA_PILOT_FIELD)]
+        return PivotSource(CellRange(source.get(tableTag('cell-range-address'))), fields)
+    raise LookupError("{}: no DataPilot table on sheet {}".format(odsPath, pivotSheet))
+
+# String -> PivotSource -> Iter {String: a}; source rows of the pivot as dicts,
+# keyed by the header of the source range
+def iterPivotSourceRows(odsPath, pivotSource):
+    srcRange = pivotSource.sourceRange
+    width = srcRange.endCol - srcRange.startCol + 1
+    header = None
+    for iRow, values in enumerate(iterSheetRows(odsPath, srcRange.sheet)):
+        if iRow < srcRange.startRow:
+            continue
+        if iRow > srcRange.endRow:
+            return
+        cells = values[srcRange.startCol : srcRange.endCol + 1]
+        cells += [''] * (width - len(cells))
+        if header is None:
+            header = [str(name) for name in cells]
+        else:
+            yield dict(zip(header, cells))
+
+# String -> String -> Iter (String, String, Float); (author type, author, views) of
+# every mention behind the DataPilot table on the sheet 'QQ', for ranking.
+def mentionRecords(odsPath, pivotSheet = 'QQ'):
+    pivotSource = findPivotSource(odsPath, pivotSheet)
+    authorField = pivotSource.fieldsOf('row')[0]
+    viewsField  = pivotSource.fieldsOf('data')[0]
+    for row in iterPivotSourceRows(odsPath, pivotSource):
+        views = row[viewsField]
+        yield (row['Author type'], str(row[authorField]),
+               views if isinstance(views, float) else 0)
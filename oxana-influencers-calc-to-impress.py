@@ -1,9 +1,21 @@
 #!python
 import sys
 import os
+import itertools
+import argparse
 import uno
+from contextlib import contextmanager
+import ods_reader
+import odp_writer
+import table_plan
+from lo_connect import connectToLO, openedForEdit
 from typing import Any
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 XController = Any
 XComponent = Any
 
@@ -23,19 +35,24 @@ class PivotRow:
                     row.getCellByPosition(1, 0).String,
                     row.getCellByPosition(2, 0).String)
 
+    # a row of DataArray: numeric cells come as floats, text ones as strings, and
+    # empty ones as ''. Views are kept as number (0 for empty) so that no string
+    # parsing is required later.
+    @classmethod
+    def fromDataRow(self, dataRow):
+        (author, views, count) = dataRow[0:3]
+        return self(str(author),
+                    int(views) if isinstance(views, float) else 0,
+                    numToString(count))
+
+def numToString(val):
+    """Formats a DataArray value the way Calc displays integral numbers"""
+    if isinstance(val, float) and val.is_integer():
+        return str(int(val))
+    return str(val)
+
 # run libreoffice as:
 # soffice --calc --accept="socket,host=localhost,port=2002;urp;StarOffice.ServiceManager"
-def connectToLO():
-    # get the uno component context from the PyUNO runtime
-    localContext = uno.getComponentContext()
-    resolver = localContext.ServiceManager.createInstanceWithContext(
-        "com.sun.star.bridge.UnoUrlResolver", localContext )
-    # connect to the running office
-    ctx = resolver.resolve( "uno:socket,host=localhost,port=2002;urp;StarOffice.ComponentContext" )
-    smgr = ctx.ServiceManager
-    desktop = smgr.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
-    # return (desktop, localContext)
-    return (desktop, smgr)
 
 def absoluteUrl(filename):
     """Constructs absolute path to the current dir in the format required by PyUNO that working with files"""
@@ -100,133 +117,433 @@ def rowToStrings(row, ncols):
     return ret
 
 # Sheet -> [String] -> [(int, Row)]; where Int is a number of views, and Row is the
-# row
-def collectFromPivotTable(sheet, filterNames):
+# row. With `verbose`, tells on stderr how many bridge calls the bulk read saved.
+def collectFromPivotTable(sheet, filterNames, verbose = False):
     pilotTable = sheet.DataPilotTables.getByIndex(0)
     filters = pilotTable.DataPilotFields.getByName('Author type').Items
     # "influencers" means bloggers and celebrity
     setFilters(filters, filterNames)
     ret = []
     pivotRange = pivotTableUsedRangeMentions(pilotTable, sheet)
-    for row in pivotRange.Rows:
-        pivotRow = PivotRow.fromRow(row)
-        mb_views = pivotRow.views # aka impressions
-        ret.append((int(mb_views.partition(',')[0]) if mb_views else 0, # 0 is required for sorting
+    # the whole range is read with a single call, as opposed to 3 calls per row
+    dataArray = pivotRange.DataArray
+    for dataRow in dataArray:
+        pivotRow = PivotRow.fromDataRow(dataRow)
+        ret.append((pivotRow.views, # aka impressions
                     pivotRow))
     ret.sort(key = lambda pair: pair[0], reverse = True) # most views first
+    if verbose:
+        print("collectFromPivotTable: read {} rows, saved {} bridge calls"
+              .format(len(dataArray), bridgeCallsSaved(len(dataArray))), file=sys.stderr)
     return ret
 
+# Int -> Int; per-row reading costs fetching the row plus 3 cells and their Strings
+def bridgeCallsSaved(nRows):
+    N_CALLS_PER_ROW = 1 + 3 * 2
+    return max(nRows * N_CALLS_PER_ROW - 1, 0)
+
+# "influencers" means bloggers and celebrity
+INFLUENCER_TYPES = ['Blogger', 'Celebrity']
+PUBLISHER_TYPES  = ['Publisher']
+
 # [(Int, Row)],
 def collectPublishers(sheet):
-    return collectFromPivotTable(sheet, ['Publisher'])
+    return collectFromPivotTable(sheet, PUBLISHER_TYPES)
 
 # [(Int, Row)],
 def collectInfluencers(sheet):
-    return collectFromPivotTable(sheet, ['Blogger', 'Celebrity'])
-
-# Row -> PivotRow -> ()
-def fillSlideRow(row, pivotRow, views):
-    row.getCellByPosition(1, 0).String = pivotRow.author
-    viewsStr = str(int(views / 1000)) + ' K' if views > 1000 else str(views)
-    row.getCellByPosition(2, 0).String = viewsStr
-    row.getCellByPosition(3, 0).String = pivotRow.count
-
-def emptyRows(slideRows, since):
-    for i in range(since, slideRows.Count):
-        row = slideRows.getByIndex(i)
-        row.getCellByPosition(1, 0).String = ''
-        row.getCellByPosition(2, 0).String = ''
-        row.getCellByPosition(3, 0).String = ''
+    return collectFromPivotTable(sheet, INFLUENCER_TYPES)
+
+# {String: [Int, Int]} -> [(Int, PivotRow)]; takes author -> [views, count]
+def sortedRanking(totals):
+    ret = [(int(views), PivotRow(author, int(views), str(count)))
+           for author, (views, count) in totals.items()]
+    # most views first, ties by author, so the order doesn't depend on the input order
+    ret.sort(key = lambda pair: (-pair[0], pair[1].author))
+    return ret
+
+# Iter (String, String, Float) -> {String: [String]} -> {String: [(Int, PivotRow)]}
+# Takes (author type, author, views) records, and groups, i.e. names mapped to
+# author types; returns a ranking per group, like the pivot table shows with the
+# author type filter set to the group. Other filters of the pivot (page fields,
+# hidden items) aren't taken into account. Records are consumed as they come.
+def rankMentions(records, groups):
+    if numpy is not None:
+        return rankMentionsNumpy(records, groups)
+    typeToGroup = {authorType: group for group, authorTypes in groups.items()
+                                     for authorType in authorTypes}
+    totals = {group: {} for group in groups}
+    for (authorType, author, views) in records:
+        group = typeToGroup.get(authorType)
+        if group is None:
+            continue
+        total = totals[group].setdefault(author, [0, 0])
+        total[0] += views
+        total[1] += 1
+    return {group: sortedRanking(totals[group]) for group in groups}
+
+RANK_CHUNK_SIZE = 65536 # records summed up by numpy at once
+
+# same as rankMentions; records are summed up by chunks, so memory use depends on
+# the number of authors rather than of records
+def rankMentionsNumpy(records, groups):
+    records = iter(records)
+    totals = {group: {} for group in groups}
+    while True:
+        chunk = list(itertools.islice(records, RANK_CHUNK_SIZE))
+        if not chunk:
+            break
+        authorTypes = numpy.array([r[0] for r in chunk], dtype=object)
+        authors     = numpy.array([r[1] for r in chunk], dtype=object)
+        views       = numpy.array([r[2] for r in chunk], dtype=float)
+        for group, groupAuthorTypes in groups.items():
+            mask = numpy.isin(authorTypes, groupAuthorTypes)
+            (uniqAuthors, iAuthors) = numpy.unique(authors[mask].astype(str),
+                                                   return_inverse=True)
+            sums   = numpy.bincount(iAuthors, weights=views[mask], minlength=len(uniqAuthors))
+            counts = numpy.bincount(iAuthors, minlength=len(uniqAuthors))
+            for author, v, c in zip(uniqAuthors.tolist(), sums.tolist(), counts.tolist()):
+                total = totals[group].setdefault(author, [0, 0])
+                total[0] += v
+                total[1] += c
+    return {group: sortedRanking(totals[group]) for group in groups}
+
+# DataPilotField -> [String] -> Int; data fields may be named like "Sum - Views"
+def pivotFieldColumn(field, header):
+    name = field.Name
+    if name not in header:
+        name = name.partition(' - ')[2]
+    return header.index(name)
+
+# Spreadsheet -> DataPilotTable -> ([String], [[a]]); header and rows of pivot source
+def pivotSourceData(spreadsheetApp, pilotTable):
+    addr = pilotTable.SourceRange
+    sheet = spreadsheetApp.Sheets.getByIndex(addr.Sheet)
+    dataArray = sheet.getCellRangeByPosition(addr.StartColumn, addr.StartRow,
+                                             addr.EndColumn,   addr.EndRow).DataArray
+    return ([str(name) for name in dataArray[0]], dataArray[1:])
+
+# Spreadsheet -> Sheet -> ([(Int, Row)], [(Int, Row)])
+# Same as collectInfluencers and collectPublishers, but the pivot source is read
+# once and grouped here, so the pivot isn't recalculated and its filters stay intact.
+def collectRankings(spreadsheetApp, sheet):
+    pilotTable = sheet.DataPilotTables.getByIndex(0)
+    (header, rows) = pivotSourceData(spreadsheetApp, pilotTable)
+    iAuthorType = header.index('Author type')
+    iAuthor     = pivotFieldColumn(pilotTable.RowFields.getByIndex(0), header)
+    iViews      = pivotFieldColumn(pilotTable.DataFields.getByIndex(0), header)
+    records = [(row[iAuthorType], str(row[iAuthor]),
+                row[iViews] if isinstance(row[iViews], float) else 0)
+               for row in rows]
+    rankings = rankMentions(records, {'influencers': INFLUENCER_TYPES,
+                                      'publishers':  PUBLISHER_TYPES})
+    return (rankings['influencers'], rankings['publishers'])
+
+# Int -> String
+def formatViews(views):
+    return str(int(views / 1000)) + ' K' if views > 1000 else str(views)
+
+# PivotRow -> Int -> [String]; contents of slide-table columns 1..3
+def slideRowContents(pivotRow, views):
+    return [pivotRow.author, formatViews(views), pivotRow.count]
+
+N_SLIDE_COLUMNS_FILLED = 3
+
+@contextmanager
+def layoutLocked(slideTable):
+    """Keeps the table shape from relayouting while its cells are being written"""
+    slideTable.addActionLock()
+    try:
+        yield
+    finally:
+        slideTable.removeActionLock()
+
+# SlideTable -> Int -> [[String]] -> (); the 1-st row is a header and is kept, the
+# `rows` go after it, and whatever rows are left in the table get blanked. Cells
+# are written one by one, Impress tables don't implement XCellRangeData.
+def writeSlideTable(slideTable, nSlideRows, rows):
+    if nSlideRows < 2:
+        return
+    data = rows + [[''] * N_SLIDE_COLUMNS_FILLED] * (nSlideRows - 1 - len(rows))
+    model = slideTable.Model
+    with layoutLocked(slideTable):
+        for iRow, row in enumerate(data, start = 1):
+            for iCol, cellStr in enumerate(row, start = 1):
+                model.getCellByPosition(iCol, iRow).setString(cellStr)
 
 # SlideTable -> Iter (Int, PivotRow) -> Iter (Int, Rows)
 def fillSlideTableFromSheet(slideTable, sheetRowsIter):
-    nSlideRowsPassed = 0
-    slideRows = slideTable.Model.Rows
-    for (i, oneSlideRow), (views, oneSheetRow) in zip(enumerate(slideRows),
-                                                      sheetRowsIter):
-        nSlideRowsPassed += 1
-        if i == 0:
-            continue # 1-st slide-table row is a header
-        fillSlideRow(oneSlideRow, oneSheetRow, views)
-    if nSlideRowsPassed < slideTable.Model.Rows.Count: # not enough pivot results
-        emptyRows(slideRows, nSlideRowsPassed)
+    nSlideRows = slideTable.Model.Rows.Count
+    capacity = nSlideRows - 1 # 1-st slide-table row is a header
+    rows = [slideRowContents(pivotRow, views)
+            for (views, pivotRow) in itertools.islice(sheetRowsIter, capacity)]
+    writeSlideTable(slideTable, nSlideRows, rows)
+    if len(rows) < capacity: # not enough pivot results
         return None
     else: # means the iter has more elements
         return sheetRowsIter
 
-# courtesy to https://forum.openoffice.org/en/forum/viewtopic.php?f=20&t=63966
-# BUG: this works, but LO sometimes too slow in doing the copy, so by time you
-# execute Paste, slide wasn't copied yet, which gonna result in further problems.
-def copySlideTo(srcApp: XComponent, dstApp: XComponent,
-                slide, insert_after: int, smgr):
-    srcController = srcApp.CurrentController
-    dstController = dstApp.CurrentController
-    dispatcher = smgr.createInstance("com.sun.star.frame.DispatchHelper")
-    srcController.setCurrentPage(slide)
-    ## begin: terrible magic to get damn thing copied
-    dispatcher.executeDispatch(srcController.Frame, ".uno:DiaMode", "", 0, ())
-    dispatcher.executeDispatch(srcController.Frame, ".uno:Copy", "", 0, ())
-    dispatcher.executeDispatch(srcController.Frame, ".uno:NormalMultiPaneGUI", "", 0, ())
-    ## end: terrible magic to get damn thing copied
-    dstController.setCurrentPage(dstApp.DrawPages.getByIndex(insert_after))
-    dispatcher.executeDispatch(dstController.Frame, ".uno:Paste", "", 0, ())
-    return dstApp.DrawPages.getByIndex(insert_after+1)
-
-# duplicates `slide`. Also sets the duplicated slide as "current".
-def copySlide(drawController, slide, smgr):
-    dispatcher = smgr.createInstance("com.sun.star.frame.DispatchHelper")
-    drawController.setCurrentPage(slide)
-    dispatcher.executeDispatch(drawController.Frame, ".uno:DuplicatePage", "", 0, ())
-    return drawController.CurrentPage
-
-
-def fillTailTables(tailTablesSlide, drawController, smgr, sheetRowsIter):
-    tailTables = tablesFromSlide(tailTablesSlide)
-    while sheetRowsIter != None:
-        for i, table in enumerate(tailTables):
-            sheetRowsIter = fillSlideTableFromSheet(table, sheetRowsIter)
-            if sheetRowsIter == None:
-                for iUnusedTables in range(i+1, len(tailTables)):
-                    tailTables[iUnusedTables].dispose()
-                break
-        if sheetRowsIter != None:
-            newTailTablesSlide = copySlide(drawController, tailTablesSlide, smgr)
-            return fillTailTables(newTailTablesSlide, drawController, smgr, sheetRowsIter)
-
-def exitIfWrongArgs():
-    if len(sys.argv) != 4:
-        print("Wrong number of arguments. Usage:\n" \
-              "{}: <file_tables_sample> <file_spreadsheet> <file_dst_presentation> <impressions|publishers>".format(sys.argv[0]))
-        exit(-1);
-
-def openDocuments(desktop) -> (XComponent, XComponent, XComponent):
-    # todo: open frames hidden, see https://forum.openoffice.org/en/forum/viewtopic.php?f=44&t=41379
-    sampleApp      = desktop.loadComponentFromURL(absoluteUrl(sys.argv[1]) ,"_blank", 0, ())
-    spreadsheetApp = desktop.loadComponentFromURL(absoluteUrl(sys.argv[2]) ,"_blank", 0, ())
-    dstApp         = desktop.loadComponentFromURL(absoluteUrl(sys.argv[3]) ,"_blank", 0, ())
-    return (sampleApp, spreadsheetApp, dstApp)
-
-# script <file_tables_sample> <file_spreadsheet> <file_dst_presentation> <impressions|publishers>
-def main():
-    exitIfWrongArgs()
-    (desktop, smgr) = connectToLO()
+# SlideTable -> Int; rows that may be filled, i.e. all but the header
+def tableCapacity(slideTable):
+    return max(slideTable.Model.Rows.Count - 1, 0)
+
+READONLY        = 16 # com.sun.star.beans.PropertyAttribute.READONLY
+AUTOLAYOUT_NONE = 20 # com.sun.star.presentation.AutoLayout.NONE
+PARAGRAPH_BREAK = 0  # com.sun.star.text.ControlCharacter.PARAGRAPH_BREAK
+GROUP_SHAPE     = 'com.sun.star.drawing.GroupShape'
+TABLE_SHAPE     = 'com.sun.star.drawing.TableShape'
+# these either belong to the source document, are looked up in the destination by
+# name (Style, TableTemplate; see copyNamedStyle), or copied separately (Background)
+SKIPPED_PROPERTIES = {'Model', 'Style', 'Layout', 'MasterPage', 'TableTemplate',
+                      'Background', 'Number', 'LinkDisplayName'}
+# properties holding objects that aren't tied to a document, so may be shared
+SHAREABLE_OBJECT_PROPERTIES = {'Graphic', 'FillBitmap'}
+
+def isUnoObject(val):
+    return hasattr(val, 'queryInterface')
 
-    (sampleApp, spreadsheetApp, dstApp) = openDocuments(desktop)
-    mentionsSheet = spreadsheetApp.Sheets.getByName('QQ')
-    # todo: check the impressions|publishers arg
-    influencersSorted = collectInfluencers(mentionsSheet)
-    # publishersSorted  = collectPublishers(mentionsSheet)
+# XPropertySet -> [String]; names of properties worth copying to another object
+def copyablePropertyNames(obj):
+    return [prop.Name for prop in obj.PropertySetInfo.Properties
+            if not prop.Attributes & READONLY and prop.Name not in SKIPPED_PROPERTIES]
 
+def copyProperties(src, dst):
+    names  = copyablePropertyNames(src)
+    values = src.getPropertyValues(names)
+    pairs  = [(name, val) for name, val in zip(names, values)
+              if val is not None
+              and (not isUnoObject(val) or name in SHAREABLE_OBJECT_PROPERTIES)]
+    try:
+        dst.setPropertyValues(tuple(name for name, _ in pairs),
+                              tuple(val  for _, val  in pairs))
+    except Exception: # one bad property fails the whole batch, so set them one by one
+        for name, val in pairs:
+            try:
+                dst.setPropertyValue(name, val)
+            except Exception:
+                pass # e.g. dst has no such property, or it's not settable right now
+
+# sets the style in `propertyName` of dst to the style of the same name in dstApp
+def copyNamedStyle(src, dst, dstApp, propertyName, family):
+    try:
+        styleName = getattr(src, propertyName).Name
+        setattr(dst, propertyName, dstApp.StyleFamilies.getByName(family).getByName(styleName))
+    except Exception:
+        pass # no style, or dst lacks it; the direct formatting is copied anyway
+
+def copyStyle(srcShape, dstShape, dstApp):
+    copyNamedStyle(srcShape, dstShape, dstApp, 'Style', 'graphics')
+
+def iterEnumeration(enumerationAccess):
+    enumeration = enumerationAccess.createEnumeration()
+    while enumeration.hasMoreElements():
+        yield enumeration.nextElement()
+
+# XText -> XText -> (); appends the text of src to dst, along with the formatting
+# of its paragraphs and text portions. Fields get copied as plain text.
+def copyText(src, dst):
+    cursor = dst.createTextCursor()
+    cursor.gotoEnd(False)
+    for (iPar, srcPar) in enumerate(iterEnumeration(src)):
+        if iPar > 0:
+            dst.insertControlCharacter(cursor, PARAGRAPH_BREAK, False)
+        copyProperties(srcPar, cursor) # the cursor is in the new paragraph
+        for portion in iterEnumeration(srcPar):
+            string = portion.String
+            if not string:
+                continue
+            dst.insertString(cursor, string, False)
+            cursor.goLeft(len(string), True) # select the inserted text to format it
+            copyProperties(portion, cursor)
+            cursor.collapseToEnd()
+
+# TableShape -> TableShape -> Impress -> (); makes dst table of the same size,
+# design and contents
+def cloneTable(srcShape, dstShape, dstApp):
+    copyNamedStyle(srcShape, dstShape, dstApp, 'TableTemplate', 'table')
+    src = srcShape.Model
+    dst = dstShape.Model
+    for (srcLines, dstLines) in [(src.Columns, dst.Columns), (src.Rows, dst.Rows)]:
+        if dstLines.Count < srcLines.Count:
+            dstLines.insertByIndex(dstLines.Count, srcLines.Count - dstLines.Count)
+        elif dstLines.Count > srcLines.Count:
+            dstLines.removeByIndex(srcLines.Count, dstLines.Count - srcLines.Count)
+        for i in range(srcLines.Count):
+            copyProperties(srcLines.getByIndex(i), dstLines.getByIndex(i))
+    for iRow in range(src.Rows.Count):
+        for iCol in range(src.Columns.Count):
+            srcCell = src.getCellByPosition(iCol, iRow)
+            dstCell = dst.getCellByPosition(iCol, iRow)
+            (colSpan, rowSpan) = (srcCell.ColumnSpan, srcCell.RowSpan)
+            if colSpan > 1 or rowSpan > 1:
+                dst.createCursorByRange(
+                    dst.getCellRangeByPosition(iCol, iRow,
+                                               iCol + colSpan - 1, iRow + rowSpan - 1)).merge()
+            copyProperties(srcCell, dstCell) # before the text, it'd override the portions
+            copyText(srcCell, dstCell)
+
+# Impress -> ShapeContainer -> ShapeContainer -> (); appends copies of shapes
+def cloneShapes(dstApp, srcShapes, dstShapes):
+    for srcShape in srcShapes:
+        shapeType = srcShape.ShapeType
+        dstShape = dstApp.createInstance(shapeType)
+        dstShapes.add(dstShape) # most properties can only be set on inserted shapes
+        if shapeType == GROUP_SHAPE:
+            cloneShapes(dstApp, srcShape, dstShape)
+        elif shapeType == TABLE_SHAPE:
+            cloneTable(srcShape, dstShape, dstApp)
+        copyStyle(srcShape, dstShape, dstApp)
+        copyProperties(srcShape, dstShape) # after the contents, so sizes stick
+        if shapeType not in (GROUP_SHAPE, TABLE_SHAPE) and hasattr(srcShape, 'String'):
+            copyText(srcShape, dstShape) # after the shape-wide character properties
+
+def findMasterPage(app, name):
+    for master in app.MasterPages:
+        if master.Name == name:
+            return master
+    return None
+
+# DrawPage -> DrawPage -> Impress -> (); the background property set belongs to
+# the source document, so a new one gets made in dstApp
+def copyBackground(srcPage, dstPage, dstApp):
+    try:
+        srcBackground = srcPage.Background
+    except Exception:
+        return # not a page having one
+    if srcBackground is None:
+        return # the page uses the background of its master
+    background = dstApp.createInstance("com.sun.star.drawing.Background")
+    copyProperties(srcBackground, background)
+    dstPage.Background = background
+
+# Impress -> MasterPage -> MasterPage; appends a copy of `srcMaster` to the master
+# pages of dstApp. Its shapes, background and properties are copied; the styles of
+# its outline and title placeholders are left as dstApp has them.
+def cloneMasterPage(dstApp, srcMaster):
+    dstMaster = dstApp.MasterPages.insertNewByIndex(dstApp.MasterPages.Count)
+    dstMaster.Name = srcMaster.Name
+    while dstMaster.Count > 0:
+        dstMaster.remove(dstMaster.getByIndex(0))
+    copyProperties(srcMaster, dstMaster)
+    copyBackground(srcMaster, dstMaster, dstApp)
+    cloneShapes(dstApp, srcMaster, dstMaster)
+    return dstMaster
+
+# Copies `slide` from srcApp to dstApp after the slide number `insertAfter`, and
+# returns the copy. Unlike the dispatch-based copy via clipboard this goes through
+# the document model, so it works with hidden frames and is done once it returns.
+def cloneSlideTo(srcApp: XComponent, dstApp: XComponent,
+                 slide, insertAfter: int):
+    dstSlide = dstApp.DrawPages.insertNewByIndex(insertAfter)
+    dstSlide.Layout = AUTOLAYOUT_NONE # placeholders get copied along with the rest
+    while dstSlide.Count > 0:
+        dstSlide.remove(dstSlide.getByIndex(0))
+    master = findMasterPage(dstApp, slide.MasterPage.Name)
+    if master is None:
+        master = cloneMasterPage(dstApp, slide.MasterPage)
+    dstSlide.MasterPage = master
+    copyProperties(slide, dstSlide)
+    copyBackground(slide, dstSlide, dstApp)
+    cloneShapes(dstApp, slide, dstSlide)
+    return dstSlide
+
+# Impress -> Int -> Int -> [DrawPage]; makes `n` copies of the slide at
+# `index`, all in one go, returns the slide and the copies
+def duplicateSlide(impressApp, index, n):
+    slide = impressApp.DrawPages.getByIndex(index)
+    for _ in range(n):
+        impressApp.duplicate(slide) # the copy goes right after the slide
+    return [impressApp.DrawPages.getByIndex(i) for i in range(index, index + n + 1)]
+
+# DrawPage -> [(Int, Int)] -> [[String]] -> Bool -> (); fills tables of a slide
+# with row ranges planned by table_plan. Tables getting no rows are removed if
+# `dropUnused`, otherwise blanked.
+def fillPlannedSlide(slide, rowRanges, rows, dropUnused):
+    for (iTable, table) in enumerate(tablesFromSlide(slide)):
+        (start, end) = rowRanges[iTable] if iTable < len(rowRanges) else (0, 0)
+        if start == end and dropUnused:
+            slide.remove(table)
+        else:
+            writeSlideTable(table, table.Model.Rows.Count, rows[start:end])
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_tables_sample')
+    parser.add_argument('file_spreadsheet')
+    parser.add_argument('file_dst_presentation')
+    parser.add_argument('ranking', nargs='?', default='impressions',
+                        choices=['impressions', 'publishers'])
+    parser.add_argument('--backend', default='uno', choices=['uno', 'odf'],
+                        help="'odf' writes slides straight into the .odp package, no office"
+                        " needed then if the spreadsheet is .ods")
+    return parser.parse_args()
+
+# String -> ([(Int, Row)], [(Int, Row)]); same as collectRankings, but the
+# spreadsheet is read straight from the .ods file, without the office
+def collectRankingsFromOds(odsPath):
+    rankings = rankMentions(ods_reader.mentionRecords(odsPath),
+                            {'influencers': INFLUENCER_TYPES,
+                             'publishers':  PUBLISHER_TYPES})
+    return (rankings['influencers'], rankings['publishers'])
+
+def collectRankingsFromFile(desktop, spreadsheetFile):
+    if spreadsheetFile.endswith('.ods'):
+        return collectRankingsFromOds(spreadsheetFile)
+    with openedForEdit(desktop, [absoluteUrl(spreadsheetFile)]) as (spreadsheetApp,):
+        mentionsSheet = spreadsheetApp.Sheets.getByName('QQ')
+        return collectRankings(spreadsheetApp, mentionsSheet)
+
+def buildSlidesUno(desktop, sampleFile, dstFile, ranking):
+    with openedForEdit(desktop, [absoluteUrl(sampleFile), absoluteUrl(dstFile)]) \
+         as (sampleApp, dstApp):
+        buildSlides(sampleApp, dstApp, ranking)
+        dstApp.store() # documents are hidden, and get closed at exit
+
+# Impress -> Impress -> [(Int, Row)] -> (); clones the sample slides into
+# `dstApp` and fills them with `ranking`. Only reads `sampleApp`, so it may be a
+# document kept open between runs, see lo_daemon.
+def buildSlides(sampleApp, dstApp, ranking):
+    rows = [slideRowContents(pivotRow, views) for (views, pivotRow) in ranking]
     topSlideSample  = sampleApp.DrawPages.getByIndex(0)
     tailSlideSample = sampleApp.DrawPages.getByIndex(1)
+    plan = table_plan.planTableRows(
+        [tableCapacity(table) for table in tablesFromSlide(topSlideSample)],
+        [tableCapacity(table) for table in tablesFromSlide(tailSlideSample)],
+        len(rows))
 
     # todo: ask oxana: how to determine where tables should be placed in? A cmd arg?
-    dstSlideTop = copySlideTo(sampleApp, dstApp, topSlideSample, 0, smgr) # todo: 0 for testing
-    sheetRowsIter = fillSlideTableFromSheet(dstSlideTop, iter(influencersSorted))
-    dstSlideTail = copySlideTo(sampleApp, dstApp, tailSlideSample, 1, smgr) # todo: 1 for testing
-    sheetRowsIter = fillTailTables(dstSlideTail, impressApp.CurrentController,
-                                   smgr, sheetRowsIter)
-    assert sheetRowsIter == None, "BUG: some rows in the sheet haven't been processed"
+    cloneSlideTo(sampleApp, dstApp, topSlideSample, 0) # todo: 0 for testing
+    if len(plan) > 1:
+        cloneSlideTo(sampleApp, dstApp, tailSlideSample, 1) # todo: 1 for testing
+    fillPlannedSlides(dstApp, 1, plan, rows)
+
+# Impress -> Int -> [[Int]] -> [[String]] -> (); the top slide is at `topIndex`,
+# followed by the tail slide if the plan has more than one slide. Makes the rest of
+# the tail slides out of it, and fills the tables of all of them as planned.
+def fillPlannedSlides(impressApp, topIndex, plan, rows):
+    slides = [impressApp.DrawPages.getByIndex(topIndex)]
+    if len(plan) > 1:
+        slides += duplicateSlide(impressApp, topIndex + 1, len(plan) - 2)
+    for (iSlide, (slide, rowRanges)) in enumerate(zip(slides, table_plan.tableRowRanges(plan))):
+        fillPlannedSlide(slide, rowRanges, rows, dropUnused = iSlide != 0)
+
+def buildSlidesOdf(sampleFile, dstFile, ranking):
+    rows = [slideRowContents(pivotRow, views) for (views, pivotRow) in ranking]
+    odp_writer.writeTableSlides(sampleFile, dstFile, dstFile, rows, insertAfter = 0)
+
+# script <file_tables_sample> <file_spreadsheet> <file_dst_presentation> [impressions|publishers] [--backend uno|odf]
+def main():
+    args = parseArgs()
+    needsOffice = args.backend == 'uno' or not args.file_spreadsheet.endswith('.ods')
+    desktop = connectToLO()[0] if needsOffice else None
+
+    (influencersSorted, publishersSorted) = collectRankingsFromFile(desktop, args.file_spreadsheet)
+    ranking = influencersSorted if args.ranking == 'impressions' else publishersSorted
+
+    if args.backend == 'uno':
+        buildSlidesUno(desktop, args.file_tables_sample, args.file_dst_presentation, ranking)
+    else:
+        buildSlidesOdf(args.file_tables_sample, args.file_dst_presentation, ranking)
 
 if __name__ == "__main__":
     main()
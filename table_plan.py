@@ -0,0 +1,37 @@
+#!python
+# Planning how ranked rows are spread over table slides, before any slide is made.
+# A presentation gets the top slide, then as many copies of the tail slide as
+# needed; every table has a header row, the rest of its rows are its capacity.
+
+# [Int] -> [Int] -> Int -> [[Int]]; number of rows every table gets, per slide.
+# The top slide is always there, with all its tables. Tail slides only get the
+# tables that have rows, the last one may thus have fewer tables than the template.
+def planTableRows(topCapacities, tailCapacities, nRows):
+    def take(capacities, nRows):
+        counts = []
+        for capacity in capacities:
+            if nRows <= 0:
+                break
+            counts.append(min(capacity, nRows))
+            nRows -= counts[-1]
+        return (counts, nRows)
+    (topCounts, nLeft) = take(topCapacities, nRows)
+    slides = [topCounts + [0] * (len(topCapacities) - len(topCounts))]
+    if nLeft > 0 and sum(tailCapacities) == 0:
+        raise ValueError("Tail slide template has no room for rows")
+    while nLeft > 0:
+        (counts, nLeft) = take(tailCapacities, nLeft)
+        slides.append(counts)
+    return slides
+
+# [[Int]] -> [[(Int, Int)]]; the plan as [start, end) ranges of rows per table
+def tableRowRanges(plan):
+    ranges = []
+    start = 0
+    for counts in plan:
+        slideRanges = []
+        for count in counts:
+            slideRanges.append((start, start + count))
+            start += count
+        ranges.append(slideRanges)
+    return ranges
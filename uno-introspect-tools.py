@@ -1,5 +1,8 @@
 import uno
 from inspect import *
+import time
+from collections import OrderedDict, deque
+from uno_snapshot import Snapshot
 
 # this is a modified version of inspect.getmembers(). It was modified to not fail on
 # uno exceptions that sometimes happen during access attempts
@@ -75,35 +78,248 @@ def getmembers_uno2(object,
             ret.append((prop_s, val))
     return ret
 
+# a name that threw on this many objects of a type in a row isn't read anymore
+MAX_THROWS = 10
+
+class TypeMembers:
+    """What is known about members of objects of some UNO type. Some properties
+    throw only in certain states of an object, so a throwing name keeps being
+    tried on later objects, till it throws MAX_THROWS times in a row."""
+    def __init__(self):
+        self.readable  = [] # names that could be read
+        self.throwing  = {} # {String: Int}; names whose reading threw -> times in a row
+        self.methods   = [] # names of methods
+        self.batchable = [] # readable names that getPropertyValues() can read in one call
+
+    def unbatchable(self):
+        batchable = set(self.batchable)
+        return [name for name in self.readable if name not in batchable]
+
+class MemberCache:
+    """Bounded cache of TypeMembers, keyed by implementation name and supported
+    types, least recently used entries get evicted first"""
+    def __init__(self, maxSize = 256):
+        self.maxSize   = maxSize
+        self.entries   = OrderedDict()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    # returns TypeMembers or None
+    def get(self, key):
+        members = self.entries.get(key)
+        if members is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return members
+
+    def put(self, key, members):
+        self.entries[key] = members
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+memberCache = MemberCache()
+
+# returns a key for MemberCache, or None if the object isn't a UNO object
+# telling its implementation and types
+def unoTypeKey(object):
+    try:
+        return (object.ImplementationName,
+                tuple(sorted(t.typeName for t in object.Types)))
+    except Exception:
+        return None
+
+# reads all members of an object one by one, classifying them along the way
+# returns: (TypeMembers, {String: a})
+def scanMembers(object):
+    members = TypeMembers()
+    values = {}
+    for name in dir(object):
+        try:
+            val = getattr(object, name)
+        except Exception:
+            members.throwing[name] = 1
+            continue
+        (members.methods if callable(val) else members.readable).append(name)
+        values[name] = val
+    if 'getPropertyValues' in values:
+        try:
+            propNames = {prop.Name for prop in object.PropertySetInfo.Properties}
+            members.batchable = [name for name in members.readable if name in propNames]
+        except Exception:
+            pass # no property set info, then reading one by one
+    return (members, values)
+
+# reads members known to be readable, properties in one batch where possible
+# returns: {String: a}
+def readMembers(object, members):
+    values = {}
+    unbatched = members.readable
+    if members.batchable:
+        try:
+            values.update(zip(members.batchable,
+                              object.getPropertyValues(members.batchable)))
+            unbatched = members.unbatchable()
+        except Exception:
+            pass # fall back to one by one
+    for name in unbatched + members.methods:
+        try:
+            values[name] = getattr(object, name)
+        except Exception:
+            continue # same type, but this one object throws; it's fine
+    for (name, nThrows) in list(members.throwing.items()):
+        if nThrows >= MAX_THROWS:
+            continue # always throws, it seems
+        try:
+            val = getattr(object, name)
+        except Exception:
+            members.throwing[name] = nThrows + 1
+            continue
+        del members.throwing[name] # readable in this state; one by one, it isn't batched
+        (members.methods if callable(val) else members.readable).append(name)
+        values[name] = val
+    return values
+
+# same as getmembers_uno2, but members of objects of the same UNO type are only
+# classified once, see MemberCache; later objects only get their readable members
+# read, in a batch where the object allows that. The cache is `memberCache` of the
+# module by default.
+# returns: [(String, a)]
+def getmembers_uno_cached(object,
+                          predicate=lambda obj: not isinstance(obj, uno.ByteSequence),
+                          cache=None):
+    if cache is None:
+        cache = memberCache # looked up now, so that it can be replaced
+    key = unoTypeKey(object)
+    members = cache.get(key) if key is not None else None
+    if members is None:
+        (members, values) = scanMembers(object)
+        if key is not None:
+            cache.put(key, members)
+    else:
+        values = readMembers(object, members)
+    return sorted([(name, val) for name, val in values.items() if predicate(val)],
+                  key=lambda pair: pair[0])
+
+# iterables searchAll doesn't descend into
+NOT_DESCENDED = (str, bytes, uno.ByteSequence)
+
+def isContainer(val):
+    return isiter(val) and not isinstance(val, NOT_DESCENDED)
+
+class Visited:
+    """Objects seen during a search. UNO objects compare and hash by identity of the
+    underlying object, so different proxies of the same object count as the same"""
+    def __init__(self):
+        self.seen = set()
+
+    # returns False if the object was already seen
+    def add(self, obj):
+        if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+            return True # values, not objects
+        try:
+            key = (True, obj)
+            hash(key)
+        except TypeError:
+            key = (False, id(obj))
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        return True
+
+def printTrace(path):
+    print('TRACE: ' + path)
+
+# Breadth-first walk over members of `unoObject` and the objects reachable through
+# iterables; yields (path, value) of every member it checks.
 # nLevels: number of levels it allowed to descend
 # predicate: types to use, except iterables
 # pIgnore: String -> Bool, accepts property name, may be used to drive search.
-def searchLimited(unoObject, valToSearch, nLevels,
-                  predicate, pIgnore, path = '<TOPLEVEL>'):
-    def try_property(property_name, val):
-        if property_name.startswith('__') or pIgnore(property_name):
-            return None # ignore private stuff
-        print('TRACE: ' + path + '.' + property_name)
+# maxNodes, timeLimit: budget, the walk stops once either is exhausted. Items of
+# containers aren't enumerated past the budget either.
+# Every object gets visited once, and every container enumerated once, however
+# many paths lead to it (e.g. .Text of every paragraph of a text).
+def walkMembers(unoObject, nLevels, predicate, pIgnore,
+                maxNodes = None, timeLimit = None, path = '<TOPLEVEL>'):
+    deadline = None if timeLimit is None else time.monotonic() + timeLimit
+    visited = Visited()
+    enumerated = Visited() # containers queued for enumeration
+    # [(Bool, a, Int, String)]: whether it's a container whose items are to be
+    # queued, the object, its level, and path
+    queue = deque([(False, unoObject, nLevels, path)])
+    nNodes = 0
+    def outOfTime():
+        return deadline is not None and time.monotonic() > deadline
+    while queue:
+        (isItems, obj, levels, objPath) = queue.popleft()
+        if isItems:
+            for index, item in enumerate(obj):
+                if (outOfTime()
+                    or (maxNodes is not None and nNodes + len(queue) >= maxNodes)):
+                    break # the rest would never get visited
+                queue.append((False, item, levels, objPath + '.<iter ' + str(index) + '>'))
+            continue
+        if not visited.add(obj):
+            continue
+        nNodes += 1
+        if (maxNodes is not None and nNodes > maxNodes) or outOfTime():
+            return
+        for (property_name, val) in getmembers_uno_cached(obj, lambda p: isiter(p) or predicate(p)):
+            if property_name.startswith('__') or pIgnore(property_name):
+                continue # ignore private stuff
+            propPath = objPath + '.' + property_name
+            yield (propPath, val)
+            if levels - 1 != 0 and isContainer(val) and enumerated.add(val):
+                queue.append((True, val, levels - 1, propPath))
+        if levels - 1 != 0 and isContainer(obj) and enumerated.add(obj):
+            queue.append((True, obj, levels - 1, objPath))
+
+# Searches `valToSearch` with walkMembers, yields paths of every match.
+# trace: String -> (), gets called with path of every property checked
+def searchAll(unoObject, valToSearch, nLevels, predicate, pIgnore,
+              maxNodes = None, timeLimit = None, trace = None, path = '<TOPLEVEL>'):
+    for (propPath, val) in walkMembers(unoObject, nLevels, predicate, pIgnore,
+                                       maxNodes, timeLimit, path):
+        if trace is not None:
+            trace(propPath)
         if val == valToSearch:
-            return 'FOUND: ' + path + '.' + property_name
-        if nLevels - 1 != 0 and isiter(val):
-            index = 0
-            for item in val:
-                ret = searchLimited(item, valToSearch, nLevels - 1, predicate, pIgnore,
-                                    path + '.' + property_name + '.<iter ' + str(index) + '>')
-                if (ret != None):
-                    return ret
-                index += 1
-    for (property_name, val) in getmembers_uno(unoObject, lambda p: isiter(p) or predicate(p)):
-        ret = try_property(property_name, val)
-        if (ret != None):
-            return ret
-    if nLevels - 1 != 0 and isiter(unoObject):
-        index = 0
-        for item in unoObject:
-            ret = searchLimited(item, valToSearch, nLevels - 1, predicate, pIgnore,
-                                 path + '.<iter ' + str(index) + '>')
-            if (ret != None):
-                return ret
-            index += 1
-    return None
+            yield propPath
+
+# same as searchAll, but returns only the first match, as 'FOUND: <path>', or None
+def searchLimited(unoObject, valToSearch, nLevels,
+                  predicate, pIgnore, path = '<TOPLEVEL>', trace = None):
+    found = next(searchAll(unoObject, valToSearch, nLevels, predicate, pIgnore,
+                           trace = trace, path = path), None)
+    return None if found is None else 'FOUND: ' + found
+
+def isSnapshotValue(val):
+    return isinstance(val, (bool, int, float, str, uno.Enum))
+
+# a -> a; something JSON can hold
+def snapshotValue(val):
+    if isinstance(val, uno.Enum):
+        return val.value
+    return val
+
+# Crawls the object graph once, the same way searchAll does, and returns a
+# uno_snapshot.Snapshot of the values found. Save it with .save(filename), then
+# search it offline with Snapshot.load(filename).find(value) and such.
+def snapshotGraph(unoObject, nLevels, predicate = isSnapshotValue,
+                  pIgnore = lambda name: False, maxNodes = None, timeLimit = None):
+    values = {}
+    for (path, val) in walkMembers(unoObject, nLevels, predicate, pIgnore,
+                                   maxNodes, timeLimit):
+        if predicate(val):
+            values[path] = snapshotValue(val)
+    meta = {'root':    getValSafe(unoObject, 'ImplementationName'),
+            'nLevels': nLevels,
+            'created': time.time()}
+    return Snapshot(values, meta)
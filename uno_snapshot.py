@@ -0,0 +1,98 @@
+#!python
+# Snapshot of values found in a UNO object graph, see snapshotGraph() in
+# uno-introspect-tools.py. It's searched, diffed and queried without LibreOffice,
+# so this module doesn't need uno.
+import bisect
+import gzip
+import json
+
+SNAPSHOT_VERSION = 2 # 1 had the indexes saved too, they're rebuilt on load now
+
+# whether `val` is a uno.Enum; checked by the type name, as uno isn't imported here
+def isUnoEnum(val):
+    return type(val).__name__ == 'Enum' and hasattr(val, 'typeName')
+
+# a -> String; the key values are indexed by. Integral floats are keyed as ints,
+# because UNO returns numbers as either, depending on the property type. Enums are
+# keyed by their value, as snapshotGraph stores them.
+def valueKey(val):
+    if isUnoEnum(val):
+        val = val.value
+    if isinstance(val, float) and val.is_integer():
+        val = int(val)
+    return json.dumps(val, sort_keys=True, ensure_ascii=False)
+
+# String -> String; name of the last member in a path, e.g. "String" for
+# "<TOPLEVEL>.Text.String", and "<iter 3>" for items of iterables
+def memberName(path):
+    return path.rpartition('.')[2]
+
+class Snapshot:
+    """Values of an object graph by their paths, plus indexes of paths by value and
+    by member name. Values are whatever JSON can hold."""
+    def __init__(self, values, meta = None):
+        self.meta    = meta or {}
+        self.paths   = sorted(values)
+        self.values  = [values[path] for path in self.paths]
+        self.byValue = {} # {String: [Int]}; valueKey -> indexes in self.paths
+        self.byName  = {} # {String: [Int]}; memberName -> indexes in self.paths
+        for i, (path, val) in enumerate(zip(self.paths, self.values)):
+            self.byValue.setdefault(valueKey(val), []).append(i)
+            self.byName.setdefault(memberName(path), []).append(i)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def value(self, path):
+        i = bisect.bisect_left(self.paths, path)
+        if i == len(self.paths) or self.paths[i] != path:
+            raise KeyError(path)
+        return self.values[i]
+
+    # a -> [String]; paths where `val` is stored
+    def find(self, val):
+        return [self.paths[i] for i in self.byValue.get(valueKey(val), [])]
+
+    # String -> [String]; paths of members named `name`
+    def findName(self, name):
+        return [self.paths[i] for i in self.byName.get(name, [])]
+
+    # String -> [String]; `prefix` and paths below it, e.g. "<TOPLEVEL>.Text" gives
+    # "<TOPLEVEL>.Text.String", but not "<TOPLEVEL>.TextFrames"
+    def withPrefix(self, prefix):
+        below = prefix + '.'
+        start = bisect.bisect_left(self.paths, below)
+        end = start
+        while end < len(self.paths) and self.paths[end].startswith(below):
+            end += 1
+        exact = bisect.bisect_left(self.paths, prefix)
+        itself = [prefix] if exact < len(self.paths) and self.paths[exact] == prefix else []
+        return itself + self.paths[start:end]
+
+    # Snapshot -> ([String], [String], [String]); paths that are only in `other`,
+    # that are only in self, and that hold different values
+    def diff(self, other):
+        mine   = dict(zip(self.paths, self.values))
+        theirs = dict(zip(other.paths, other.values))
+        added   = [path for path in other.paths if path not in mine]
+        removed = [path for path in self.paths if path not in theirs]
+        changed = [path for path in self.paths
+                   if path in theirs and valueKey(mine[path]) != valueKey(theirs[path])]
+        return (added, removed, changed)
+
+    def save(self, filename):
+        with gzip.open(filename, 'wt', encoding='utf-8') as f:
+            json.dump({'version': SNAPSHOT_VERSION,
+                       'meta':    self.meta,
+                       'paths':   self.paths,
+                       'values':  self.values},
+                      f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(self, filename):
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') not in (1, SNAPSHOT_VERSION):
+            raise ValueError("{}: unsupported snapshot version {}"
+                             .format(filename, data.get('version')))
+        return self(dict(zip(data['paths'], data['values'])), data['meta'])
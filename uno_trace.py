@@ -0,0 +1,186 @@
+#!python
+# Tracing of calls over the UNO bridge. UNO objects get wrapped into proxies that
+# time every method call, property get and set, and iteration step, attributing
+# them to the Python function they were made from. Enabled by the UNO_TRACE
+# environment variable, see tracingFromEnv(); it costs nothing otherwise.
+#
+# UNO_TRACE=1 python3 script.py ...              # report on stderr at exit
+# UNO_TRACE=calls.folded python3 script.py ...   # plus stacks for flamegraph.pl
+import atexit
+import os
+import sys
+import threading
+import time
+
+class BridgeTracer:
+    """Counts and times bridge calls by (calling function, UNO member), and by the
+    whole Python stack for flamegraphs"""
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.calls  = {} # {(String, String): [Int, Float]}; (function, member) -> count, seconds
+        self.stacks = {} # {String: Float}; folded stack -> seconds
+
+    # [String]; names of Python functions that made the call, outermost first
+    @staticmethod
+    def callerStack():
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code.co_name)
+            frame = frame.f_back
+        stack.reverse()
+        return stack or ['<unknown>']
+
+    # [String] -> String; the innermost named function, so that calls made in
+    # comprehensions and lambdas are attributed to the function they're written in
+    @staticmethod
+    def callingFunction(stack):
+        for name in reversed(stack):
+            if not name.startswith('<'):
+                return name
+        return '<module>'
+
+    def record(self, member, seconds):
+        stack = self.callerStack()
+        folded = ';'.join(stack + ['uno:' + member])
+        with self.lock:
+            entry = self.calls.setdefault((self.callingFunction(stack), member), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            self.stacks[folded] = self.stacks.get(folded, 0.0) + seconds
+
+    def report(self, out = sys.stderr, limit = 50):
+        with self.lock:
+            rows = sorted(self.calls.items(), key = lambda item: item[1][1], reverse = True)
+        nCalls = sum(count for (_, (count, _)) in rows)
+        total  = sum(seconds for (_, (_, seconds)) in rows)
+        print("UNO bridge calls: {} in {:.3f} s".format(nCalls, total), file=out)
+        print("{:>8} {:>10} {:>9}  {}".format("calls", "total ms", "avg us", "function: member"),
+              file=out)
+        for ((function, member), (count, seconds)) in rows[:limit]:
+            print("{:>8} {:>10.1f} {:>9.1f}  {}: {}".format(
+                count, seconds * 1e3, seconds / count * 1e6, function, member), file=out)
+
+    # stacks in the "folded" format of flamegraph.pl, values are microseconds
+    def writeFolded(self, path):
+        with self.lock:
+            stacks = list(self.stacks.items())
+        with open(path, 'w') as out:
+            for (stack, seconds) in stacks:
+                out.write("{} {}\n".format(stack, int(seconds * 1e6)))
+
+def isUnoObject(val):
+    return type(val).__name__ == 'pyuno'
+
+def wrap(val, tracer):
+    if isUnoObject(val):
+        return Traced(val, tracer)
+    if type(val) is tuple and any(isUnoObject(item) for item in val):
+        return tuple(wrap(item, tracer) for item in val)
+    return val
+
+def unwrap(val):
+    if isinstance(val, Traced):
+        return object.__getattribute__(val, '_obj')
+    if type(val) is tuple:
+        return tuple(unwrap(item) for item in val)
+    return val
+
+class Traced:
+    """Proxy of a UNO object, reporting bridge calls made through it to a tracer.
+    Objects returned from it are wrapped as well, arguments passed to it are
+    unwrapped, so the proxies may be used in place of the real objects."""
+    __slots__ = ('_obj', '_tracer')
+
+    def __init__(self, obj, tracer):
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_tracer', tracer)
+
+    def _timed(self, member, f, *args):
+        start = time.perf_counter()
+        try:
+            return f(*args)
+        finally:
+            object.__getattribute__(self, '_tracer').record(member, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        obj    = object.__getattribute__(self, '_obj')
+        tracer = object.__getattribute__(self, '_tracer')
+        start = time.perf_counter()
+        val = getattr(obj, name)
+        if not callable(val): # a property get; looking a method up isn't a bridge call
+            tracer.record(name, time.perf_counter() - start)
+            return wrap(val, tracer)
+        def tracedMethod(*args):
+            return wrap(self._timed(name + '()', val, *unwrap(args)), tracer)
+        return tracedMethod
+
+    def __setattr__(self, name, val):
+        self._timed(name + ' =', setattr, object.__getattribute__(self, '_obj'), name,
+                    unwrap(val))
+
+    # not a generator, so that iter() of a proxy of a non-iterable raises right away,
+    # same as iter() of the object itself
+    def __iter__(self):
+        return self._tracedItems(self._timed('iter', iter, object.__getattribute__(self, '_obj')))
+
+    def _tracedItems(self, it):
+        tracer = object.__getattribute__(self, '_tracer')
+        while True:
+            try:
+                item = self._timed('next', next, it)
+            except StopIteration:
+                return
+            yield wrap(item, tracer)
+
+    def __bool__(self): # otherwise bool() would go to __len__, and fail for non-containers
+        return True
+
+    def __len__(self):
+        return self._timed('len', len, object.__getattribute__(self, '_obj'))
+
+    def __getitem__(self, key):
+        return wrap(self._timed('[]', lambda obj: obj[key], object.__getattribute__(self, '_obj')),
+                    object.__getattribute__(self, '_tracer'))
+
+    def __contains__(self, item):
+        return self._timed('in', lambda obj: unwrap(item) in obj,
+                           object.__getattribute__(self, '_obj'))
+
+    def __eq__(self, other):
+        return object.__getattribute__(self, '_obj') == unwrap(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(object.__getattribute__(self, '_obj'))
+
+    def __repr__(self):
+        return repr(object.__getattribute__(self, '_obj'))
+
+    def __dir__(self):
+        return dir(object.__getattribute__(self, '_obj'))
+
+tracer = None # the tracer of the process, when tracing is enabled
+
+# Returns the process tracer if UNO_TRACE is set, None otherwise. The first call
+# registers the report at exit. UNO_TRACE may be a path to write folded stacks to.
+def tracingFromEnv():
+    global tracer
+    setting = os.environ.get('UNO_TRACE')
+    if not setting or setting == '0':
+        return None
+    if tracer is None:
+        tracer = BridgeTracer()
+        atexit.register(tracer.report)
+        if setting not in ('1', 'report'):
+            atexit.register(tracer.writeFolded, setting)
+    return tracer
+
+# wraps `obj` when tracing is enabled, returns it as is otherwise
+def traced(obj):
+    envTracer = tracingFromEnv()
+    return obj if envTracer is None else wrap(obj, envTracer)